@@ -0,0 +1,263 @@
+"""
+End-to-end benchmark of bulk forwarding against a simulated Telegram backend.
+No accounts, channels or network needed: fake session clients serve synthetic
+video messages with configurable latency, jitter, FloodWait and auth failures.
+
+Usage:
+    python benchmarks/bulk_forward.py [--sizes 100,1000,10000] [--sessions 3]
+        [--latency 0.05] [--jitter 0.02] [--flood-rate 0.01] [--auth-failures 1] [--album-size 10]
+        [--fetch sparse|ids] [--targets 3] [--no-autotune]
+
+Every run uses a fresh state database, so dedup and resume never skip work.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import Counter
+from types import SimpleNamespace
+
+# bot.py reads these at import time
+os.environ.setdefault('API_ID', '0')
+os.environ.setdefault('API_HASH', 'benchmark')
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from telethon.errors import FloodWaitError, AuthKeyUnregisteredError  # noqa: E402
+from telethon.tl.types import InputPeerChannel, DocumentAttributeFilename, InputMessagesFilterDocument  # noqa: E402
+
+import bot  # noqa: E402
+
+CHANNEL_ID = -1001606225518
+TARGET_CHAT = 4242
+
+class FakeDocument:
+    def __init__(self, msg_id):
+        self.id = 10_000_000 + msg_id
+        self.access_hash = msg_id
+        self.file_reference = b''
+        self.size = random.randint(80, 400) * 1024 * 1024
+        self.mime_type = 'video/x-matroska'
+        self.attributes = [DocumentAttributeFilename(f"Show.S01E{msg_id:03d}.mkv")]
+
+class FakeMessage:
+    def __init__(self, msg_id, is_video):
+        self.id = msg_id
+        self.chat_id = CHANNEL_ID
+        self.document = FakeDocument(msg_id) if is_video else None
+        self.media = self.document
+        self.video = None
+        self.noforwards = False
+        self.message = (
+            f"📟 Episode - {msg_id} [S01]\n🎧 Language - Hindi #OFFICIAL\n📀 Quality : 1080p - FHD"
+            if is_video else "Join our channel for more!"
+        )
+
+class Backend:
+    """Source channel contents shared by every simulated session"""
+
+    def __init__(self, video_ratio, seed):
+        self.rng = random.Random(seed)
+        self.video_ratio = video_ratio
+        self.videos = {}
+
+    def is_video(self, msg_id):
+        if msg_id not in self.videos:
+            self.videos[msg_id] = self.rng.random() < self.video_ratio
+        return self.videos[msg_id]
+
+class FakeClient:
+    """Stands in for a session's TelegramClient in session_clients"""
+
+    def __init__(self, name, backend, latency, jitter, flood_rate, flood_seconds, auth_failed=False):
+        self.session = SimpleNamespace(filename=f"{name}.session")
+        self.backend = backend
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.auth_failed = auth_failed
+        self.banned_until = 0.0
+        self.rpcs = Counter()
+        self.sent = 0
+
+    async def rpc(self, method):
+        self.rpcs[method] += 1
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        if self.auth_failed:
+            raise AuthKeyUnregisteredError(request=None)
+
+        now = time.monotonic()
+        if now < self.banned_until:
+            raise FloodWaitError(request=None, capture=int(self.banned_until - now) + 1)
+        if random.random() < self.flood_rate:
+            self.banned_until = now + self.flood_seconds
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+
+    async def __call__(self, request):
+        await self.rpc(type(request).__name__)
+
+    async def get_entity(self, entity):
+        await self.rpc('get_entity')
+        return entity
+
+    async def get_input_entity(self, entity):
+        return InputPeerChannel(int(str(CHANNEL_ID)[4:]), 1)
+
+    async def get_messages(self, entity, ids=None, limit=None, filter=None, min_id=0, max_id=0, **kwargs):
+        if filter is not None:
+            # Search runs newest first, the simulated videos are files so only the document filter finds them
+            await self.rpc('search')
+            if filter is not InputMessagesFilterDocument:
+                return []
+            found = (FakeMessage(i, True) for i in range(max_id - 1, min_id, -1) if self.backend.is_video(i))
+            return [message for _, message in zip(range(limit), found)]
+
+        await self.rpc('get_messages')
+        if isinstance(ids, list):
+            return [FakeMessage(i, self.backend.is_video(i)) for i in ids]
+        return FakeMessage(ids, self.backend.is_video(ids))
+
+    async def send_message(self, entity, message, file=None, **kwargs):
+        await self.rpc('send_message')
+        self.sent += 1
+        return SimpleNamespace(id=self.sent, message=message, media=file)
+
+    async def send_file(self, entity, files, caption=None, **kwargs):
+        await self.rpc('send_multi_media')
+        sent = []
+        for text, media in zip(caption, files):
+            self.sent += 1
+            sent.append(SimpleNamespace(id=self.sent, message=text, media=media))
+        return sent
+
+    async def edit_message(self, entity, message, text=None, **kwargs):
+        await self.rpc('edit_message')
+
+    def is_connected(self):
+        return True
+
+class FakeStatusMessage:
+    def __init__(self):
+        self.edits = 0
+
+    async def edit(self, text, **kwargs):
+        self.edits += 1
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run_job(size, args, seed):
+    """Forward one synthetic range and collect its numbers"""
+    random.seed(seed)
+    backend = Backend(args.video_ratio, seed)
+    clients = [
+        FakeClient(
+            f"bench{n}", backend, args.latency, args.jitter, args.flood_rate, args.flood_seconds,
+            auth_failed=n < args.auth_failures
+        )
+        for n in range(args.sessions)
+    ]
+
+    # Fresh state and scheduler for every run
+    bot.DATA_DIR = tempfile.mkdtemp(prefix='bench-state-')
+    bot.init_state()
+    bot.scheduler = bot.SessionScheduler(args.session_rate, args.session_burst)
+    bot.autotuner = bot.Autotuner()
+    bot.AUTOTUNE = not args.no_autotune
+    bot.ALBUM_SIZE = args.album_size
+    bot.SPARSE_FETCH = args.fetch == 'sparse'
+    bot.session_clients[:] = clients
+
+    # Time every send as the pipeline sees it, albums count as one send
+    latencies = []
+    originals = bot.send_video, bot.send_video_album
+
+    def timed(send):
+        async def timed_send(*a, **kw):
+            started = time.perf_counter()
+            try:
+                return await send(*a, **kw)
+            finally:
+                latencies.append(time.perf_counter() - started)
+        return timed_send
+
+    bot.send_video, bot.send_video_album = map(timed, originals)
+    try:
+        state = bot.UserState()
+        state.start_link = f"https://t.me/c/{str(CHANNEL_ID)[4:]}/1"
+        state.end_link = f"https://t.me/c/{str(CHANNEL_ID)[4:]}/{size}"
+        state.name = "Benchmark"
+        status_msg = FakeStatusMessage()
+        targets = [TARGET_CHAT + n for n in range(args.targets)]
+        job_id = bot.journal.create(0, state, targets)
+
+        started = time.perf_counter()
+        await bot.run_bulk_job(job_id, state, targets, status_msg)
+        elapsed = time.perf_counter() - started
+    finally:
+        bot.send_video, bot.send_video_album = originals
+        bot.state_db.close()
+
+    rpcs = sum((client.rpcs for client in clients), Counter())
+    videos = sum(client.sent for client in clients)
+    return {
+        'size': size,
+        'elapsed': elapsed,
+        'videos': videos,
+        'expected': sum(backend.videos.values()) * args.targets,
+        'msgs_per_sec': size / elapsed,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'rpcs': rpcs,
+        'status_edits': status_msg.edits,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help="Comma separated message ranges to forward")
+    parser.add_argument('--sessions', type=int, default=3, help="Simulated session accounts")
+    parser.add_argument('--latency', type=float, default=0.05, help="Mean RPC latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="RPC latency standard deviation")
+    parser.add_argument('--video-ratio', type=float, default=0.7, help="Share of messages that are videos")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="Chance an RPC starts a FloodWait")
+    parser.add_argument('--flood-seconds', type=int, default=2, help="Length of injected FloodWaits")
+    parser.add_argument('--auth-failures', type=int, default=0, help="Sessions whose auth key is revoked")
+    parser.add_argument('--session-rate', type=float, default=50, help="SESSION_RATE for the run")
+    parser.add_argument('--session-burst', type=int, default=50, help="SESSION_BURST for the run")
+    parser.add_argument('--album-size', type=int, default=1, help="ALBUM_SIZE for the run")
+    parser.add_argument('--fetch', choices=('sparse', 'ids'), default='sparse', help="Search filters or the ID walk")
+    parser.add_argument('--targets', type=int, default=1, help="Target chats every video is sent to")
+    parser.add_argument('--no-autotune', action='store_true', help="Keep the starting batch size and send window")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Per-message log lines would dominate the numbers, injected failures show up in the table
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    print(
+        f"{'size':>6} {'wall s':>8} {'msg/s':>8} {'videos':>11} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'fetch':>6} {'send':>6} {'other':>6} {'edits':>6}"
+    )
+    for size in (int(s) for s in args.sizes.split(',')):
+        result = asyncio.run(run_job(size, args, args.seed))
+        rpcs = result['rpcs']
+        sends = rpcs['send_message'] + rpcs['send_multi_media']
+        fetches = rpcs['get_messages'] + rpcs['search']
+        other = sum(rpcs.values()) - fetches - sends
+        print(
+            f"{result['size']:>6} {result['elapsed']:>8.2f} {result['msgs_per_sec']:>8.1f} "
+            f"{result['videos']:>5}/{result['expected']:<5} {result['p50'] * 1000:>8.1f} {result['p99'] * 1000:>8.1f} "
+            f"{fetches:>6} {sends:>6} {other:>6} {result['status_edits']:>6}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Micro-benchmark for caption parsing.
+Compares parse_caption(), with its precompiled patterns and lazily parsed extra
+fields, with the per-pattern extractors it replaced, both as they were (episode
+and quality) and grown the same way to all five fields.
+
+Usage:
+    python benchmarks/captions.py [captions.txt] [--repeat N]
+
+captions.txt holds one caption per block, blocks separated by a blank line
+(e.g. exported from a source channel). Without it a corpus built from the
+caption styles of the channels we forward from is used.
+"""
+import os
+import re
+import sys
+import random
+import argparse
+import timeit
+
+# bot.py reads these at import time
+os.environ.setdefault('API_ID', '0')
+os.environ.setdefault('API_HASH', 'benchmark')
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bot  # noqa: E402
+
+def legacy_extract_episode(caption):
+    """extract_episode() before parse_caption() replaced it"""
+    if not caption:
+        return "00"
+
+    patterns = [
+        r'Episode\s*-?\s*(\d+)',
+        r'Ep\.?\s*-?\s*(\d+)',
+        r'E(\d+)',
+        r'\[S\d+E(\d+)\]',
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, caption, re.IGNORECASE)
+        if match:
+            return match.group(1).zfill(2)
+
+    return "00"
+
+def legacy_extract_quality(caption):
+    """extract_quality() before parse_caption() replaced it"""
+    if not caption:
+        return "720p"
+
+    patterns = [
+        r'(\d{3,4}p)',
+        r'Quality\s*:?\s*(\d{3,4}p)',
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, caption, re.IGNORECASE)
+        if match:
+            return match.group(1)
+
+    return "720p"
+
+# The extra fields parse_caption() knows, written the way the old extractors would have grown
+LEGACY_FIELD_PATTERNS = {
+    'season': [r'Season\s*-?\s*(\d+)', r'\bS(\d{1,2})(?!\d)'],
+    'codec': [r'(x26[45]|H\.?26[45]|HEVC|AVC|AV1)\b'],
+    'language': [r'Language\s*[-:]?\s*([A-Za-z]+)', r'(Hindi|English|Japanese|Tamil|Telugu|Dual\s*Audio|Multi\s*Audio)\b'],
+}
+
+def legacy_extract_field(caption, patterns):
+    for pattern in patterns:
+        match = re.search(pattern, caption, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return None
+
+TEMPLATES = [
+    "📟 Episode - {ep} [S{season:02d}]\n🎧 Language - {lang} #OFFICIAL\n📀 Quality : {quality} - FHD\n🌐 [@Anime_Freak_Official_Hindi]",
+    "{title} [S{season:02d}E{ep:02d}] {quality} {codec} {lang}",
+    "{title} - Ep.{ep} | {quality} | {lang} Dub\nJoin @AnimeChannel",
+    "🎬 {title}\nSeason {season} Episode {ep}\nQuality: {quality}\nAudio: {lang}\n{codec} 10bit",
+    "[@Channel] {title} E{ep:03d} {quality} WEB-DL {codec}",
+    "{title} EP {ep} {quality}",
+    "{title} Movie {quality} {lang}",
+    "",
+]
+TITLES = ["Death Note", "Naruto Shippuden", "One Piece", "Jujutsu Kaisen", "Demon Slayer", "Attack on Titan"]
+QUALITIES = ["480p", "720p", "1080p", "2160p"]
+CODECS = ["x264", "x265", "HEVC", "H.264", "AV1"]
+LANGUAGES = ["Hindi", "English", "Japanese", "Tamil", "Dual Audio"]
+
+def build_corpus(size, seed=7):
+    """Synthetic captions in the styles of our source channels, with episode runs repeating"""
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < size:
+        template = rng.choice(TEMPLATES)
+        title = rng.choice(TITLES)
+        season = rng.randint(1, 5)
+        codec = rng.choice(CODECS)
+        lang = rng.choice(LANGUAGES)
+        # The same episode usually comes in several qualities
+        for ep in range(1, rng.randint(2, 25)):
+            for quality in rng.sample(QUALITIES, rng.randint(1, 3)):
+                corpus.append(template.format(
+                    title=title, season=season, ep=ep, quality=quality, codec=codec, lang=lang
+                ))
+    return corpus[:size]
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [block.strip() for block in f.read().split('\n\n') if block.strip()]
+
+def legacy(corpus):
+    for caption in corpus:
+        legacy_extract_episode(caption)
+        legacy_extract_quality(caption)
+
+def legacy_all_fields(corpus):
+    for caption in corpus:
+        legacy_extract_episode(caption)
+        legacy_extract_quality(caption)
+        for patterns in LEGACY_FIELD_PATTERNS.values():
+            legacy_extract_field(caption, patterns)
+
+def parsed_uncached(corpus):
+    parse = bot.parse_caption.__wrapped__
+    for caption in corpus:
+        parse(caption)
+
+def parsed_all_fields(corpus):
+    parse = bot.parse_caption.__wrapped__
+    for caption in corpus:
+        meta = parse(caption)
+        meta.season, meta.codec, meta.language
+
+def parsed_cached(corpus):
+    parse = bot.parse_caption
+    for caption in corpus:
+        parse(caption)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='?', help="File with one caption per blank-line separated block")
+    parser.add_argument('--size', type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing runs, the best one is reported")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus(args.size)
+
+    # The parser must agree with the old extractors before its speed matters
+    def parsed(caption):
+        meta = bot.parse_caption(caption)
+        return meta.episode, meta.quality, meta.season, meta.codec, meta.language
+
+    def expected(caption):
+        return (
+            legacy_extract_episode(caption),
+            legacy_extract_quality(caption),
+            *(legacy_extract_field(caption, patterns) for patterns in LEGACY_FIELD_PATTERNS.values()),
+        )
+
+    mismatches = [caption for caption in corpus if parsed(caption) != expected(caption)]
+    print(f"Corpus: {len(corpus)} captions, {len(set(corpus))} unique, {len(mismatches)} mismatches")
+    for caption in mismatches[:5]:
+        print(f"  mismatch: {caption!r}")
+
+    results = []
+    runs = [
+        ("legacy, 2 fields", legacy),
+        ("legacy, 5 fields", legacy_all_fields),
+        ("parse_caption", parsed_uncached),
+        ("parse_caption, 5 fields", parsed_all_fields),
+        ("parse_caption + LRU", parsed_cached),
+    ]
+    for name, func in runs:
+        bot.parse_caption.cache_clear()
+        best = min(timeit.repeat(lambda: func(corpus), number=1, repeat=args.repeat))
+        results.append((name, best))
+
+    baseline = results[0][1]
+    for name, best in results:
+        print(f"{name:<24} {best * 1000:8.1f} ms  {best / len(corpus) * 1e6:6.2f} µs/caption  {baseline / best:5.2f}x")
+
+if __name__ == '__main__':
+    main()
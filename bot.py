@@ -1,87 +1,378 @@
 import os
 import re
 import asyncio
-import threading
+import time
 from telethon import TelegramClient, events
 from telethon.tl.functions.channels import JoinChannelRequest
-from telethon.errors import FloodWaitError, AuthKeyUnregisteredError, UserDeactivatedBanError, ChannelPrivateError
+from telethon.tl.functions.upload import SaveFilePartRequest, SaveBigFilePartRequest
+from telethon.tl.types import (
+    InputPeerChannel, InputFile, InputFileBig, InputMessagesFilterVideo, InputMessagesFilterDocument,
+    InputMessagesFilterGif, InputMessagesFilterRoundVideo
+)
+from telethon.errors import (
+    FloodWaitError, AuthKeyUnregisteredError, UserDeactivatedBanError, ChannelPrivateError, TimedOutError,
+    ChannelInvalidError, ChannelBannedError, UserBannedInChannelError, InviteHashExpiredError, InviteHashInvalidError,
+    UsernameNotOccupiedError, UsernameInvalidError,
+    ChatForwardsRestrictedError, ChatWriteForbiddenError, ChatSendMediaForbiddenError, PeerIdInvalidError
+)
 from dotenv import load_dotenv
 import logging
 import glob
+import random
+import functools
+import io
+import json
+import queue
+import atexit
+import sqlite3
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+import contextlib
+import hmac
+import tracemalloc
+from collections import deque, OrderedDict, defaultdict
 from datetime import datetime
-from fastapi import FastAPI
-import uvicorn
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 # Load environment variables
 load_dotenv()
 
+class StartupProfile:
+    """Wall time of each startup phase, reported once the bot is up when PROFILE is on"""
+    
+    def __init__(self):
+        # Imports run before any timer exists, the CPU time spent on them so far stands in
+        self.phases = [('imports', time.process_time())]
+        self.marked = time.perf_counter()
+    
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.marked))
+        self.marked = now
+    
+    def report(self):
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+        current, peak = tracemalloc.get_traced_memory()
+        logging.info(
+            "⏱️ Startup: %s, total %.2fs | traced memory %s, peak %s",
+            phases, sum(seconds for _, seconds in self.phases), format_size(current), format_size(peak)
+        )
+
+startup = StartupProfile()
+
 # Configure logging
-logging.basicConfig(
-    format='[%(levelname)s/%(asctime)s] %(name)s: %(message)s',
-    level=logging.INFO
-)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text, or json for log shippers
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+SUCCESS_LOG_EVERY = int(os.getenv('SUCCESS_LOG_EVERY', '50'))  # Routine per-message successes per logged line
+
+# Set for the task running a job or session worker, copied into every record it logs
+log_job = contextvars.ContextVar('log_job', default=None)
+log_session = contextvars.ContextVar('log_session', default=None)
+LOG_FIELDS = ('job_id', 'session', 'msg_id', 'elapsed', 'count', 'peak_memory', 'loop_lag')
+
+class LogContextFilter(logging.Filter):
+    """Tag records with the job and session of the task that logged them"""
+    
+    def filter(self, record):
+        if getattr(record, 'job_id', None) is None:
+            record.job_id = log_job.get()
+        if getattr(record, 'session', None) is None:
+            record.session = log_session.get()
+        return True
+
+class LogQueueHandler(QueueHandler):
+    """Hands records to the listener thread untouched, so formatting happens off the event loop"""
+    
+    def prepare(self, record):
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the tracing fields a record carries"""
+    
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging():
+    """Send every record through a queue to a background thread that formats and writes it"""
+    output = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('[%(levelname)s/%(asctime)s] %(name)s: %(message)s'))
+    
+    handler = LogQueueHandler(queue.SimpleQueue())
+    handler.addFilter(LogContextFilter())
+    logging.basicConfig(level=LOG_LEVEL, handlers=[handler])
+    
+    listener = QueueListener(handler.queue, output)
+    listener.start()
+    atexit.register(listener.stop)
+
+setup_logging()
+
+success_counts = defaultdict(int)
+
+def log_success(kind, msg, *args, **fields):
+    """Log one in SUCCESS_LOG_EVERY routine successes of a kind, counting the ones it stands for"""
+    success_counts[kind] += 1
+    if success_counts[kind] < SUCCESS_LOG_EVERY:
+        return
+    fields['count'] = success_counts.pop(kind)
+    logging.info(msg, *args, extra=fields)
 
 # Bot configuration
 API_ID = int(os.getenv('API_ID'))
 API_HASH = os.getenv('API_HASH')
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+OWNER_IDS = {int(i) for i in os.getenv('OWNER_IDS', '').replace(',', ' ').split()}  # Users who may send jobs to other chats
 SESSIONS_DIR = 'sessions'  # Directory containing session files
+SESSION_START_TIMEOUT = float(os.getenv('SESSION_START_TIMEOUT', '30'))  # Seconds one session may take to connect
+SESSION_START_CONCURRENCY = int(os.getenv('SESSION_START_CONCURRENCY', '5'))  # Sessions connecting at once
+LAZY_SESSIONS = os.getenv('LAZY_SESSIONS', 'false').lower() == 'true'  # Connect each session on first use
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '60'))  # Seconds between probes of one session
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '10'))  # Seconds before a probe counts as timed out
+HEALTH_MAX_TIMEOUTS = int(os.getenv('HEALTH_MAX_TIMEOUTS', '3'))  # Consecutive timeouts before quarantine
+HEALTH_MAX_ERROR_RATE = float(os.getenv('HEALTH_MAX_ERROR_RATE', '0.5'))  # Recent failure share before quarantine
+RECONNECT_BACKOFF_BASE = float(os.getenv('RECONNECT_BACKOFF_BASE', '5'))  # First reconnect delay in seconds
+RECONNECT_BACKOFF_MAX = float(os.getenv('RECONNECT_BACKOFF_MAX', '600'))  # Longest reconnect delay in seconds
+
+# Bulk forward tuning
+FETCH_BATCH_SIZE = int(os.getenv('FETCH_BATCH_SIZE', '10'))  # Message IDs per get_messages call, the starting point when autotuning
+FETCH_BATCH_MAX = 100  # Message IDs per get_messages call, the most Telegram takes
+PREFETCH_BATCHES = int(os.getenv('PREFETCH_BATCHES', '4'))  # Batches read ahead of the senders
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', '5'))  # Sends in flight per session, the starting point when autotuning
+SEND_CONCURRENCY_MAX = int(os.getenv('SEND_CONCURRENCY_MAX', '20'))  # Most sends in flight per session when autotuning
+AUTOTUNE = os.getenv('AUTOTUNE', 'true').lower() == 'true'  # Adapt batch size and sends in flight to each session
+AUTOTUNE_LATENCY_FACTOR = float(os.getenv('AUTOTUNE_LATENCY_FACTOR', '2'))  # Latency over the session's best that stops growth
+ALBUM_SIZE = max(1, min(10, int(os.getenv('ALBUM_SIZE', '1'))))  # Videos per media group send, 1 sends them one by one
+TARGET_CONCURRENCY = int(os.getenv('TARGET_CONCURRENCY', '0'))  # Sends in flight to one target per job, 0 for every sender
+SHARD_SESSIONS = os.getenv('SHARD_SESSIONS', 'true').lower() == 'true'  # Split one range across all sessions
+SHARD_SIZE = int(os.getenv('SHARD_SIZE', '50'))  # Message IDs per shard, the unit of work stealing
+SPARSE_FETCH = os.getenv('SPARSE_FETCH', 'true').lower() == 'true'  # Find videos with server-side search filters
+SPARSE_SHARD_SIZE = int(os.getenv('SPARSE_SHARD_SIZE', '300'))  # Message IDs per shard when searching
+SEARCH_PAGE_SIZE = 100  # Messages per search request, the most Telegram returns
+SESSION_RATE = float(os.getenv('SESSION_RATE', '3'))  # Sustained requests per second per session
+SESSION_BURST = int(os.getenv('SESSION_BURST', '10'))  # Requests a rested session may fire at once
+MAX_RUNNING_JOBS = int(os.getenv('MAX_RUNNING_JOBS', '2'))  # Bulk jobs running at once across all users
+MAX_JOBS_PER_USER = int(os.getenv('MAX_JOBS_PER_USER', '1'))  # Bulk jobs one user may run at once
+PLAN_PAGE_SIZE = 100  # Messages per history request in plan mode, the most Telegram returns
+CAPTION_CACHE_SIZE = int(os.getenv('CAPTION_CACHE_SIZE', '4096'))  # Parsed captions kept in memory
+STATUS_EDIT_INTERVAL = float(os.getenv('STATUS_EDIT_INTERVAL', '3'))  # Minimum seconds between progress edits
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '1'))  # Seconds between event loop lag samples
+PROFILE = os.getenv('PROFILE', 'false').lower() == 'true'  # Log startup phase timings and per-job peak memory and loop lag
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', '8000'))  # Port of the health, readiness and metrics server
+LIVENESS_MAX_LAG = float(os.getenv('LIVENESS_MAX_LAG', '15'))  # Event loop lag in seconds before /health fails
+READY_MIN_SESSIONS = int(os.getenv('READY_MIN_SESSIONS', '1'))  # Healthy sessions needed to report ready
+READY_MAX_QUEUE = int(os.getenv('READY_MAX_QUEUE', '10'))  # Waiting jobs above which /ready fails
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # Bearer token of the admin job API, unset disables it
+ADMIN_USER_ID = 0  # Owner of jobs submitted over the admin API, they share one queue turn
+EVENTS_POLL_INTERVAL = 1  # Seconds between progress checks of a streamed job
+EVENTS_KEEPALIVE = 15  # Seconds a quiet progress stream waits before a keepalive comment
+
+# Persistent state
+DATA_DIR = os.getenv('DATA_DIR', 'data')  # Directory holding the SQLite state database
+ACCESS_CACHE_TTL = int(os.getenv('ACCESS_CACHE_TTL', str(7 * 24 * 3600)))  # Seconds a verified channel access is trusted
+ACCESS_CACHE_NEGATIVE_TTL = int(os.getenv('ACCESS_CACHE_NEGATIVE_TTL', '600'))  # Seconds a failed probe is remembered
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'skip')  # Default for already forwarded media: skip, recaption or resend
+DEDUP_MODES = ('skip', 'recaption', 'resend')
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')  # Where user conversations live: sqlite or memory
+USER_STATE_TTL = int(os.getenv('USER_STATE_TTL', '3600'))  # Seconds an unfinished conversation is kept
+HISTORY_SIZE = 10  # Jobs listed by /history
+
+# Download and re-upload
+REUPLOAD_MODE = os.getenv('REUPLOAD_MODE', 'fallback')  # off, fallback when sending by reference fails, or always
+DOWNLOAD_DIR = os.getenv('DOWNLOAD_DIR', 'downloads')  # Spool directory for downloaded media
+SPOOL_MAX_BYTES = int(float(os.getenv('SPOOL_MAX_GB', '10')) * 1024 ** 3)  # Disk the spool may use before evicting
+TRANSFER_CHUNK_SIZE = 512 * 1024  # Bytes per download request and upload part, the largest Telegram takes
+TRANSFER_WORKERS = int(os.getenv('TRANSFER_WORKERS', '4'))  # Parallel chunk requests per file
+MAX_TRANSFERS = int(os.getenv('MAX_TRANSFERS', '2'))  # Files downloading or uploading at once
+
+if PROFILE:
+    # Tracing slows every allocation down, so only when asked
+    tracemalloc.start()
 
 # Store user states and session clients
-user_states = {}
+user_states = None  # UserStateStore, opened by init_state()
 session_clients = []  # List of active user clients
+started_sessions = set()  # Indexes of session_clients that have connected at least once
+session_locks = {}  # Index -> lock serialising the first connect of a lazy session
+start_slots = asyncio.Semaphore(SESSION_START_CONCURRENCY)  # Bounds concurrent session handshakes
+transfer_slots = asyncio.Semaphore(MAX_TRANSFERS)  # Bounds concurrent download/re-upload transfers
 bot_id = None
+bot_client = None
+loop_lag = 0.0  # Last measured event loop lag in seconds
+loop_lag_sampled = time.monotonic()  # When monitor_loop_lag last woke up
+state_db = None  # Shared SQLite connection, opened by init_state()
+access_cache = None
+journal = None
+forward_index = None
+spool = None  # Downloaded media on disk, opened by init_state()
 
 class UserState:
+    __slots__ = (
+        'mode', 'start_link', 'end_link', 'name', 'current_session_index', 'dedup_mode', 'plan', 'targets', 'touched'
+    )
+    
     def __init__(self):
         self.mode = None
         self.start_link = None
         self.end_link = None
         self.name = None
         self.current_session_index = 0
+        self.dedup_mode = DEDUP_MODE
+        self.plan = False  # Preview the next range instead of sending it
+        self.targets = []  # Chats jobs post to, empty for the chat the job was started from
+        self.touched = time.time()
 
-# Create FastAPI app for health checks
-health_app = FastAPI()
+# Prometheus metrics, served on /metrics
+MESSAGES_FETCHED = Counter('bot_messages_fetched_total', "Message IDs fetched from source channels", ['session'])
+VIDEOS_SENT = Counter('bot_videos_sent_total', "Videos sent to target chats", ['session'])
+FAILURES = Counter('bot_failures_total', "Failed operations by exception type", ['operation', 'error'])
+FLOOD_WAIT_SECONDS = Counter('bot_flood_wait_seconds_total', "FloodWait seconds imposed on each session", ['session'])
+SEND_LATENCY = Histogram(
+    'bot_send_seconds', "Time to send one video", ['session'],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+)
+FETCH_LATENCY = Histogram('bot_fetch_seconds', "Time to fetch one message batch", ['session'])
+SESSION_PROBES = Counter('bot_session_probes_total', "Channel access checks by outcome", ['session', 'result'])
+SESSION_DISCOVERY = Histogram('bot_session_discovery_seconds', "Time to find working sessions for a job")
+QUEUED_JOBS = Gauge('bot_queued_jobs', "Bulk jobs waiting to start")
+ACTIVE_JOBS = Gauge('bot_active_jobs', "Bulk jobs running")
+HEALTHY_SESSIONS = Gauge('bot_healthy_sessions', "Sessions not in quarantine")
+LOOP_LAG = Gauge('bot_event_loop_lag_seconds', "How late the event loop ran a timer at the last sample")
+TRANSFER_BYTES = Counter('bot_transfer_bytes_total', "Bytes downloaded to or uploaded from the spool", ['direction'])
+SPOOL_BYTES = Gauge('bot_spool_bytes', "Disk used by spooled media")
+FETCH_BATCH = Gauge('bot_fetch_batch_size', "Autotuned message IDs per fetch", ['session'])
+SEND_WINDOW = Gauge('bot_send_window', "Autotuned sends in flight", ['session'])
+SPOOL_BYTES.set_function(lambda: spool.used() if spool else 0)
 
-@health_app.get("/")
-async def root():
-    return {
-        "status": "running",
-        "bot": "connected",
-        "sessions": len(session_clients),
-        "time": datetime.now().isoformat()
-    }
+def count_failure(operation, error):
+    FAILURES.labels(operation, type(error).__name__).inc()
 
-@health_app.get("/health")
-async def health():
-    return {
-        "status": "healthy",
-        "sessions": len(session_clients),
-        "bot_connected": True
-    }
+def bot_connected():
+    return bool(bot_client and bot_client.is_connected())
+
+def current_loop_lag():
+    """Lag of the last sample, or longer if the sampler itself is overdue"""
+    overdue = time.monotonic() - loop_lag_sampled - LOOP_LAG_INTERVAL
+    return max(loop_lag, overdue, 0.0)
+
+# Tried in order for each field like the extractors' pattern lists, first match wins
+CAPTION_PATTERNS = {
+    field: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for field, patterns in {
+        'episode': [r'Episode\s*-?\s*(\d+)', r'Ep\.?\s*-?\s*(\d+)', r'E(\d+)', r'\[S\d+E(\d+)\]'],
+        'quality': [r'(\d{3,4}p)', r'Quality\s*:?\s*(\d{3,4}p)'],
+        'season': [r'Season\s*-?\s*(\d+)', r'\bS(\d{1,2})(?!\d)'],
+        'codec': [r'(x26[45]|H\.?26[45]|HEVC|AVC|AV1)\b'],
+        'language': [r'Language\s*[-:]?\s*([A-Za-z]+)', r'(Hindi|English|Japanese|Tamil|Telugu|Dual\s*Audio|Multi\s*Audio)\b'],
+    }.items()
+}
+
+def search_caption(caption, field):
+    """First match of a field's patterns, None when the caption doesn't have it"""
+    for pattern in CAPTION_PATTERNS[field]:
+        match = pattern.search(caption)
+        if match:
+            return match.group(1)
+    return None
 
-def run_health_server():
-    """Run FastAPI server for Koyeb health checks"""
-    uvicorn.run(health_app, host="0.0.0.0", port=8000, log_level="error")
+UNPARSED = object()  # Lazy CaptionMeta field that hasn't been searched for yet
 
-def extract_episode(caption):
-    """Extract episode number from caption"""
-    if not caption:
-        return "00"
+class CaptionMeta:
+    """Metadata parsed from a source caption and file name, fields captions rarely need on first use"""
+    __slots__ = ('caption', 'episode', 'quality', 'ext', 'lazy_season', 'lazy_codec', 'lazy_language')
     
-    patterns = [
-        r'Episode\s*-?\s*(\d+)',
-        r'Ep\.?\s*-?\s*(\d+)',
-        r'E(\d+)',
-        r'\[S\d+E(\d+)\]',
-    ]
+    def __init__(self, caption, episode="00", quality="720p", ext="mp4"):
+        self.caption = caption  # The string parse_caption's cache is keyed on, not a copy
+        self.episode = episode
+        self.quality = quality
+        self.ext = ext
+        self.lazy_season = self.lazy_codec = self.lazy_language = UNPARSED
     
-    for pattern in patterns:
-        match = re.search(pattern, caption, re.IGNORECASE)
-        if match:
-            return match.group(1).zfill(2)
+    def lazy(self, field):
+        """A field searched for on first use and kept in its slot"""
+        value = getattr(self, f'lazy_{field}')
+        if value is UNPARSED:
+            value = search_caption(self.caption, field)
+            setattr(self, f'lazy_{field}', value)
+        return value
+    
+    @property
+    def season(self):
+        return self.lazy('season')
+    
+    @property
+    def codec(self):
+        return self.lazy('codec')
+    
+    @property
+    def language(self):
+        return self.lazy('language')
+
+@functools.lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def parse_caption(caption, file_name=None):
+    """Parse the fields every caption needs with precompiled patterns, cached for repeated captions"""
+    meta = CaptionMeta(caption or "")
+    
+    if caption:
+        meta.episode = (search_caption(caption, 'episode') or "00").zfill(2)
+        meta.quality = search_caption(caption, 'quality') or meta.quality
     
-    return "00"
+    if file_name and '.' in file_name:
+        meta.ext = file_name.split('.')[-1]
+    
+    return meta
+
+def create_client(session_file):
+    """Client for a session file, not connected yet"""
+    client = TelegramClient(session_file.replace('.session', ''), API_ID, API_HASH)
+    # Surface every FloodWait to the scheduler instead of sleeping inside Telethon
+    client.flood_sleep_threshold = 0
+    return client
+
+async def connect_session(client):
+    """Connect a session client and check it is still logged in"""
+    await client.connect()
+    if not await client.is_user_authorized():
+        raise AuthKeyUnregisteredError(request=None)
+    return await client.get_me()
+
+async def start_session(client):
+    """Connect one session within the startup pool and timeout"""
+    async with start_slots:
+        try:
+            return await asyncio.wait_for(connect_session(client), SESSION_START_TIMEOUT)
+        except BaseException:
+            # Don't leave a half-open connection behind
+            await client.disconnect()
+            raise
+
+async def ensure_session(index):
+    """Connect a lazily loaded session the first time it is used"""
+    client = session_clients[index]
+    if index in started_sessions or client.is_connected():
+        return client
+    
+    lock = session_locks.setdefault(index, asyncio.Lock())
+    async with lock:
+        if index not in started_sessions:
+            me = await start_session(client)
+            started_sessions.add(index)
+            logging.info(f"✅ Connected session {index + 1} on first use ({me.first_name} {me.last_name or ''})")
+    return client
 
 async def load_sessions():
     """Load all session files from sessions directory"""
@@ -91,7 +382,7 @@ async def load_sessions():
     os.makedirs(SESSIONS_DIR, exist_ok=True)
     
     # Find all .session files
-    session_files = glob.glob(os.path.join(SESSIONS_DIR, '*.session'))
+    session_files = sorted(glob.glob(os.path.join(SESSIONS_DIR, '*.session')))
     
     if not session_files:
         logging.warning(f"No session files found in '{SESSIONS_DIR}' directory!")
@@ -100,45 +391,210 @@ async def load_sessions():
     
     logging.info(f"Found {len(session_files)} session file(s)")
     
-    for session_file in session_files:
-        try:
-            # Get session name without extension
-            session_name = session_file.replace('.session', '')
-            
-            # Create and start client
-            client = TelegramClient(session_name, API_ID, API_HASH)
-            await client.start()
-            
-            # Verify session is valid
-            me = await client.get_me()
+    # Creating a client only reads its session file, no network yet
+    clients = [create_client(session_file) for session_file in session_files]
+    
+    if LAZY_SESSIONS:
+        session_clients.extend(clients)
+        logging.info(f"Registered {len(clients)} session(s), each connects on first use")
+        return
+    
+    # Connect all sessions at once, a slow or broken one only fails itself
+    results = await asyncio.gather(*(start_session(client) for client in clients), return_exceptions=True)
+    
+    for session_file, client, result in zip(session_files, clients, results):
+        session_name = os.path.basename(session_file).replace('.session', '')
+        if isinstance(result, BaseException):
+            # The monitor only tries a broken file again once it is replaced
+            monitor.rejected[os.path.basename(session_file)] = os.path.getmtime(session_file)
+        if isinstance(result, asyncio.TimeoutError):
+            logging.error(f"❌ Failed to load session {session_name}: no answer within {SESSION_START_TIMEOUT:.0f}s")
+        elif isinstance(result, BaseException):
+            logging.error(f"❌ Failed to load session {session_name}: {result}")
+        else:
+            started_sessions.add(len(session_clients))
             session_clients.append(client)
-            
-            logging.info(f"✅ Loaded session: {os.path.basename(session_name)} ({me.first_name} {me.last_name or ''})")
-            
-        except Exception as e:
-            logging.error(f"❌ Failed to load session {os.path.basename(session_file)}: {e}")
+            logging.info(f"✅ Loaded session: {session_name} ({result.first_name} {result.last_name or ''})")
     
     if session_clients:
         logging.info(f"Successfully loaded {len(session_clients)} session(s)")
     else:
         logging.error("No valid sessions loaded! Bot may not function properly.")
 
-def extract_quality(caption):
-    """Extract quality from caption"""
-    if not caption:
-        return "720p"
+class SessionHealth:
+    def __init__(self):
+        self.error_rate = 0.0  # Moving average, 1.0 when every recent call failed
+        self.latency = None  # Moving average of probe and fetch latency in seconds
+        self.timeouts = 0  # Consecutive probe timeouts
+        self.quarantined = None  # Reason the session is kept away from jobs
+        self.retries = 0
+        self.retry_at = 0.0
+        self.probe_at = 0.0
+
+class SessionMonitor:
+    """Probes sessions, quarantines broken ones and reconnects them with backoff"""
     
-    patterns = [
-        r'(\d{3,4}p)',
-        r'Quality\s*:?\s*(\d{3,4}p)',
-    ]
+    SMOOTHING = 0.2
+    TICK = 5  # Seconds between passes over the sessions
     
-    for pattern in patterns:
-        match = re.search(pattern, caption, re.IGNORECASE)
-        if match:
-            return match.group(1)
+    def __init__(self):
+        self.sessions = {}
+        self.rejected = {}  # Session file -> mtime of a file that failed to load
+        self.starting = set()  # New session files connecting in the background
+    
+    def get(self, index):
+        if index not in self.sessions:
+            self.sessions[index] = SessionHealth()
+        return self.sessions[index]
+    
+    def healthy(self, index):
+        # Read-only, metrics and readiness checks call this too
+        health = self.sessions.get(index)
+        return health is None or health.quarantined is None
+    
+    def healthy_indexes(self):
+        """Sessions jobs may use, fastest first, unmeasured ones count as fast"""
+        healthy = [i for i in range(len(session_clients)) if self.healthy(i)]
+        return sorted(healthy, key=lambda i: (self.sessions[i].latency or 0.0) if i in self.sessions else 0.0)
+    
+    def record(self, index, ok, latency=None):
+        """Feed the outcome of a call made with a session"""
+        health = self.get(index)
+        health.error_rate += self.SMOOTHING * ((0.0 if ok else 1.0) - health.error_rate)
+        if latency is not None:
+            health.latency = latency if health.latency is None else \
+                health.latency + self.SMOOTHING * (latency - health.latency)
+        
+        # The average starts at 0, so a few failures in a row are needed to get here
+        if health.error_rate > HEALTH_MAX_ERROR_RATE and health.quarantined is None:
+            self.quarantine(index, f"{health.error_rate:.0%} of recent calls failed")
+    
+    def quarantine(self, index, reason, permanent=False):
+        """Keep a session away from jobs until it is reconnected, or for good"""
+        health = self.get(index)
+        if health.quarantined is None:
+            logging.error(f"🚫 Session {index + 1} quarantined: {reason}")
+        health.quarantined = reason
+        if permanent:
+            health.retry_at = float('inf')
+        else:
+            self.schedule_retry(health)
+    
+    def schedule_retry(self, health):
+        """Exponential backoff with jitter so sessions don't reconnect in lockstep"""
+        delay = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_BASE * 2 ** health.retries)
+        health.retry_at = time.monotonic() + delay * random.uniform(0.5, 1.5)
+        health.retries += 1
+    
+    async def check(self, index):
+        """Cheap liveness probe of a connected session"""
+        client = session_clients[index]
+        health = self.get(index)
+        health.probe_at = time.monotonic() + HEALTH_CHECK_INTERVAL
+        
+        if not client.is_connected():
+            self.quarantine(index, "disconnected")
+            health.retry_at = time.monotonic()
+            return
+        
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(client.get_me(), HEALTH_PROBE_TIMEOUT)
+        except (AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
+            self.quarantine(index, f"{type(e).__name__}", permanent=True)
+            return
+        except asyncio.TimeoutError:
+            self.record(index, False)
+            health.timeouts += 1
+            if health.timeouts >= HEALTH_MAX_TIMEOUTS:
+                self.quarantine(index, f"{health.timeouts} probe timeouts in a row")
+            return
+        except Exception as e:
+            self.record(index, False)
+            logging.warning(f"Health probe of session {index + 1} failed: {e}")
+            return
+        
+        health.timeouts = 0
+        self.record(index, True, time.monotonic() - started)
+    
+    async def recover(self, index):
+        """Reconnect a quarantined session"""
+        client = session_clients[index]
+        health = self.get(index)
+        try:
+            await client.disconnect()
+            await start_session(client)
+        except (AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
+            self.quarantine(index, f"{type(e).__name__}", permanent=True)
+            return
+        except Exception as e:
+            self.schedule_retry(health)
+            logging.warning(f"Reconnecting session {index + 1} failed, next try in {health.retry_at - time.monotonic():.0f}s: {e}")
+            return
+        
+        logging.info(f"✅ Session {index + 1} reconnected after {health.quarantined}")
+        started_sessions.add(index)
+        self.sessions[index] = SessionHealth()
+        self.sessions[index].probe_at = time.monotonic() + HEALTH_CHECK_INTERVAL
+    
+    async def discover(self):
+        """Load .session files dropped into the sessions directory since startup"""
+        known = {session_key(i) for i in range(len(session_clients))}
+        for session_file in sorted(glob.glob(os.path.join(SESSIONS_DIR, '*.session'))):
+            name = os.path.basename(session_file)
+            if name in known:
+                continue
+            
+            # Only retry a broken file once it was replaced
+            mtime = os.path.getmtime(session_file)
+            if self.rejected.get(name) == mtime:
+                continue
+            
+            if LAZY_SESSIONS:
+                logging.info(f"✅ Registered new session: {name}")
+                self.rejected.pop(name, None)
+                session_clients.append(create_client(session_file))
+            elif name not in self.starting:
+                # A slow file must not hold up the probes and reconnects of this pass
+                self.starting.add(name)
+                asyncio.create_task(self.load(name, mtime, create_client(session_file)))
+    
+    async def load(self, name, mtime, client):
+        """Connect a new session file and hand it to jobs once it works"""
+        try:
+            me = await start_session(client)
+        except Exception as e:
+            self.rejected[name] = mtime
+            reason = f"no answer within {SESSION_START_TIMEOUT:.0f}s" if isinstance(e, asyncio.TimeoutError) else e
+            logging.error(f"❌ Failed to load new session {name}: {reason}")
+            return
+        finally:
+            self.starting.discard(name)
+        
+        self.rejected.pop(name, None)
+        started_sessions.add(len(session_clients))
+        session_clients.append(client)
+        logging.info(f"✅ Loaded new session: {name} ({me.first_name} {me.last_name or ''})")
     
-    return "720p"
+    async def tick(self, index):
+        health = self.get(index)
+        now = time.monotonic()
+        if health.quarantined is not None:
+            if now >= health.retry_at:
+                await self.recover(index)
+        elif index in started_sessions and now >= health.probe_at:
+            await self.check(index)
+    
+    async def run(self):
+        while True:
+            try:
+                await self.discover()
+                await asyncio.gather(*(self.tick(i) for i in range(len(session_clients))))
+            except Exception as e:
+                logging.error(f"Error in session monitor: {e}")
+            await asyncio.sleep(self.TICK)
+
+monitor = SessionMonitor()
 
 def format_size(size_bytes):
     """Convert bytes to human readable format"""
@@ -179,10 +635,137 @@ async def start_handler(event):
         f"Send start and end links:\n"
         f"`https://t.me/c/1606225518/1259`\n"
         f"`https://t.me/c/1606225518/1414`\n\n"
+        f"Send /plan first to preview a range without sending anything.\n\n"
         f"Ready to process your videos! 🚀",
         parse_mode='markdown'
     )
 
+async def dedup_handler(event):
+    """Choose what happens to videos that were already forwarded"""
+    user_id = event.sender_id
+    state = user_states.get(user_id)
+    
+    parts = event.message.text.split()
+    if len(parts) > 1 and parts[1].lower() in DEDUP_MODES:
+        state.dedup_mode = parts[1].lower()
+        user_states.save(user_id)
+    
+    await event.respond(
+        f"♻️ **Already forwarded videos:** `{state.dedup_mode}`\n\n"
+        f"• `/dedup skip` - don't send them again\n"
+        f"• `/dedup recaption` - only fix the caption of the earlier copy\n"
+        f"• `/dedup resend` - always send a new copy",
+        parse_mode='markdown'
+    )
+
+async def targets_handler(event):
+    """Choose the chats bulk jobs post to"""
+    user_id = event.sender_id
+    state = user_states.get(user_id)
+    
+    # Session accounts post wherever targets point, so only owners may aim them elsewhere
+    if user_id not in OWNER_IDS:
+        await event.respond("⛔ **Only the bot's owners can choose targets.** Jobs post to this chat.", parse_mode='markdown')
+        return
+    
+    parts = event.message.text.split()[1:]
+    if parts == ['here']:
+        state.targets = []
+        user_states.save(user_id)
+    elif parts:
+        try:
+            state.targets = await resolve_targets(parts)
+        except Exception as e:
+            await event.respond(f"❌ **Unknown target:** {str(e)}", parse_mode='markdown')
+            return
+        user_states.save(user_id)
+    
+    current = ", ".join(f"`{target}`" for target in state.targets) or "this chat"
+    await event.respond(
+        f"🎯 **Jobs post to:** {current}\n\n"
+        f"• `/targets -100123 @mirror` - post every video to each of these chats\n"
+        f"• `/targets here` - post to this chat only\n\n"
+        f"Session accounts need permission to post in every target.",
+        parse_mode='markdown'
+    )
+
+async def resolve_targets(parts):
+    """Chat IDs of numeric IDs and usernames, without duplicates"""
+    # Sessions do the posting, so they resolve usernames too
+    index = next(iter(monitor.healthy_indexes()), None)
+    targets = []
+    for part in parts:
+        part = str(part)
+        if re.fullmatch(r'-?\d+', part):
+            targets.append(int(part))
+        elif index is not None:
+            client = await ensure_session(index)
+            targets.append(await client.get_peer_id(part))
+        else:
+            raise ValueError("no session to resolve usernames with")
+    return list(dict.fromkeys(targets))
+
+async def plan_handler(event):
+    """Preview the next range instead of forwarding it"""
+    user_id = event.sender_id
+    user_states.get(user_id).plan = True
+    user_states.save(user_id)
+    
+    await event.respond(
+        "🧪 **Plan mode**\n\n"
+        "Send the start and end links and the name as usual.\n"
+        "The range is scanned and previewed, nothing is sent.",
+        parse_mode='markdown'
+    )
+
+JOB_STATUS_ICONS = {'done': '✅', 'failed': '❌', 'cancelled': '🛑', 'running': '🔄'}
+
+async def history_handler(event):
+    """List the user's recent jobs with a shortcut to run each again"""
+    jobs = journal.history(event.sender_id, HISTORY_SIZE)
+    if not jobs:
+        await event.respond("ℹ️ No jobs yet.")
+        return
+    
+    lines = ["📜 **Your recent jobs**\n"]
+    for job_id, start_link, end_link, name, status, videos, failed, duplicates in jobs:
+        _, first = parse_channel_link(start_link)
+        _, last = parse_channel_link(end_link)
+        lines.append(
+            f"{JOB_STATUS_ICONS.get(status, '•')} **{name}** `{first}-{last}`\n"
+            f"    {videos} sent, {failed} failed, {duplicates} already forwarded · /repeat_{job_id}"
+        )
+    await event.respond("\n".join(lines), parse_mode='markdown')
+
+async def repeat_handler(event):
+    """Queue a past job again with the same range and name"""
+    user_id = event.sender_id
+    match = re.search(r'(\d+)', event.message.text)
+    row = journal.job(int(match.group(1)), user_id) if match else None
+    if not row:
+        await event.respond("❌ **Unknown job.** Send /history to see yours.", parse_mode='markdown')
+        return
+    
+    state = UserState()
+    state.start_link, state.end_link, state.name, targets = row
+    state.dedup_mode = user_states.get(user_id).dedup_mode
+    if user_id not in OWNER_IDS:
+        targets = [event.chat_id]
+    await submit_job(event, user_id, state, targets)
+
+async def cancel_handler(event):
+    """Cancel the user's queued and running jobs"""
+    user_id = event.sender_id
+    
+    # Also abandon a half-finished link/name conversation
+    user_states.reset(user_id)
+    
+    count = await job_queue.cancel(user_id)
+    if count:
+        await event.respond(f"🛑 **Cancelled {count} job(s).**", parse_mode='markdown')
+    else:
+        await event.respond("ℹ️ Nothing to cancel.")
+
 async def handle_message(event, bot):
     global bot_id
     
@@ -201,11 +784,8 @@ async def handle_message(event, bot):
         await event.respond("❌ No active sessions available! Please add session files to the 'sessions' directory.")
         return
     
-    # Initialize user state
-    if user_id not in user_states:
-        user_states[user_id] = UserState()
-    
-    state = user_states[user_id]
+    # Load or create user state
+    state = user_states.get(user_id)
     
     # Check for links
     links = re.findall(r'https://t\.me/[^\s]+', text)
@@ -214,6 +794,7 @@ async def handle_message(event, bot):
     if len(links) == 1 and state.mode == 'waiting_second_link':
         state.end_link = links[0]
         state.mode = 'bulk_name'
+        user_states.save(user_id)
         
         await event.respond(
             "📋 **Bulk Mode Activated**\n\n"
@@ -228,6 +809,7 @@ async def handle_message(event, bot):
     if len(links) == 1 and state.mode != 'bulk_name':
         state.mode = 'waiting_second_link'
         state.start_link = links[0]
+        user_states.save(user_id)
         
         await event.respond(
             "📝 **First link received!**\n\n"
@@ -242,6 +824,7 @@ async def handle_message(event, bot):
         state.mode = 'bulk_name'
         state.start_link = links[0]
         state.end_link = links[1]
+        user_states.save(user_id)
         
         await event.respond(
             "📋 **Bulk Mode Activated**\n\n"
@@ -257,18 +840,28 @@ async def handle_message(event, bot):
         state.name = text.strip()
         state.mode = None
         
-        status_msg = await event.respond("🔄 **Processing bulk forward...**\nUsing multiple sessions for reliability.", parse_mode='markdown')
+        # Reset state, keeping the user's preferences
+        user_states.reset(user_id)
         
-        try:
-            await process_bulk_forward(event, state, status_msg)
-        except Exception as e:
-            await status_msg.edit(f"❌ **Error:** {str(e)}")
-            logging.error(f"Bulk forward error: {e}")
+        # Targets saved before an owner list was set don't count for other users
+        targets = (user_id in OWNER_IDS and state.targets) or [event.chat_id]
+        if state.plan:
+            status_msg = await event.respond("🧪 **Scanning range...**\nNothing will be sent.", parse_mode='markdown')
+            asyncio.create_task(run_plan(state, targets, status_msg))
+            return
         
-        # Reset state
-        user_states[user_id] = UserState()
+        await submit_job(event, user_id, state, targets)
         return
 
+async def submit_job(event, user_id, state, targets):
+    """Journal a bulk job and queue it"""
+    status_msg = await event.respond("🔄 **Processing bulk forward...**\nUsing multiple sessions for reliability.", parse_mode='markdown')
+    job_id = journal.create(user_id, state, targets)
+    
+    position = job_queue.submit(BulkJob(job_id, user_id, state, targets, status_msg))
+    if position:
+        await status_msg.edit(f"⏳ **Queued:** position {position}\nSend /cancel to drop it.")
+
 async def join_channel_if_needed(client, channel_id):
     """Try to join a channel if not already a member"""
     try:
@@ -287,202 +880,2142 @@ async def join_channel_if_needed(client, channel_id):
             logging.error(f"Failed to join channel {channel_id}: {join_error}")
             return False
 
-async def get_working_client(channel_id, msg_id):
-    """Try each session client until one works"""
-    for i, client in enumerate(session_clients):
-        try:
-            # First try to ensure we're a member of the channel
-            await join_channel_if_needed(client, channel_id)
-            
-            # Test if client can access the message
-            message = await client.get_messages(channel_id, ids=msg_id)
-            if message:
-                logging.info(f"Using session {i+1} for message {msg_id}")
-                return client, i
-        except (AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
-            logging.error(f"Session {i+1} is invalid: {e}")
-            continue
-        except Exception as e:
-            logging.warning(f"Session {i+1} failed to access message: {e}")
-            continue
-    
-    return None, -1
+def session_key(index):
+    """Stable name of a session that survives restarts"""
+    client = session_clients[index]
+    filename = getattr(client.session, 'filename', None)
+    return os.path.basename(filename) if filename else str(index)
 
-async def process_bulk_forward(event, state, status_msg):
-    """Process bulk forward with automatic session failover - FAST VERSION"""
-    channel_id_start, msg_id_start = parse_channel_link(state.start_link)
-    channel_id_end, msg_id_end = parse_channel_link(state.end_link)
+class ChannelAccessCache:
+    """Remembers which sessions can read which channels, so known channels need no probing"""
     
-    if not channel_id_start or not channel_id_end:
-        await status_msg.edit("❌ **Error:** Invalid links provided!")
-        return
+    def __init__(self, conn, ttl, negative_ttl):
+        self.conn = conn
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS channel_access ("
+            "channel TEXT, session TEXT, ok INTEGER, peer_id INTEGER, access_hash INTEGER, verified_at REAL, "
+            "PRIMARY KEY (channel, session))"
+        )
+        self.conn.commit()
     
-    if channel_id_start != channel_id_end:
-        await status_msg.edit("❌ **Error:** Both links must be from the same channel!")
-        return
+    def lookup(self, channel, session):
+        """(ok, input_peer) for a fresh entry, None when unknown or expired"""
+        row = self.conn.execute(
+            "SELECT ok, peer_id, access_hash, verified_at FROM channel_access WHERE channel = ? AND session = ?",
+            (str(channel), session)
+        ).fetchone()
+        if not row:
+            return None
+        
+        ok, peer_id, access_hash, verified_at = row
+        if time.time() - verified_at > (self.ttl if ok else self.negative_ttl):
+            self.evict(channel, session)
+            return None
+        
+        peer = InputPeerChannel(peer_id, access_hash) if peer_id is not None else None
+        return bool(ok), peer
     
-    video_count = 0
-    processed = 0
-    failed_count = 0
-    total = msg_id_end - msg_id_start + 1
-    target_chat = event.chat_id
+    def input_peer(self, channel, session):
+        """Cached input entity for a channel, None when unknown"""
+        entry = self.lookup(channel, session)
+        return entry[1] if entry else None
     
-    # Find a working client for this channel
-    await status_msg.edit("🔍 **Finding available session...**")
-    test_client, session_index = await get_working_client(channel_id_start, msg_id_start)
+    def store(self, channel, session, ok, input_entity=None):
+        peer_id = access_hash = None
+        if isinstance(input_entity, InputPeerChannel):
+            peer_id, access_hash = input_entity.channel_id, input_entity.access_hash
+        
+        self.conn.execute(
+            "INSERT OR REPLACE INTO channel_access VALUES (?, ?, ?, ?, ?, ?)",
+            (str(channel), session, int(ok), peer_id, access_hash, time.time())
+        )
+        self.conn.commit()
     
-    if not test_client:
-        await status_msg.edit(
-            "❌ **Error:** No session can access this channel!\n\n"
-            "**Possible reasons:**\n"
-            "• Channel is private and sessions are not members\n"
-            "• Sessions need to join the channel first\n\n"
-            "**Solution:** Make sure at least one session account joins the channel manually first."
+    def evict(self, channel, session):
+        self.conn.execute(
+            "DELETE FROM channel_access WHERE channel = ? AND session = ?", (str(channel), session)
         )
-        return
+        self.conn.commit()
+
+class JobJournal:
+    """Records bulk jobs and per-message results so interrupted jobs can resume"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, start_link TEXT, end_link TEXT, "
+            "name TEXT, target_chat INTEGER, status TEXT, checkpoint INTEGER, created_at REAL, updated_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id INTEGER, msg_id INTEGER, result TEXT, PRIMARY KEY (job_id, msg_id))"
+        )
+        
+        # Outcome counts, added after the first databases were created
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for column in ('videos', 'failed', 'duplicates'):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER DEFAULT 0")
+        # Every chat of a fan-out job, target_chat keeps the first
+        if 'targets' not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN targets TEXT")
+        # What repeats do, a resumed job must keep it
+        if 'dedup_mode' not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN dedup_mode TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_user ON jobs (user_id, job_id)")
+        # Items of jobs finished before finish() cleaned them up
+        self.conn.execute("DELETE FROM job_items WHERE job_id IN (SELECT job_id FROM jobs WHERE status != 'running')")
+        self.conn.commit()
+        
+        # job_id -> (checkpoint, completed IDs above the checkpoint)
+        self.progress = {}
     
-    await status_msg.edit(f"✅ **Using session {session_index + 1}**\n\n🚀 Starting rapid download...")
+    def create(self, user_id, state, targets):
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO jobs (user_id, start_link, end_link, name, target_chat, targets, dedup_mode, status, checkpoint, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'running', NULL, ?, ?)",
+            (user_id, state.start_link, state.end_link, state.name, targets[0], format_targets(targets), state.dedup_mode,
+             now, now)
+        )
+        self.conn.commit()
+        return cursor.lastrowid
     
-    current_client = test_client
-    current_session = session_index
+    def unfinished(self):
+        """Jobs that were still running when the process stopped"""
+        return [
+            (job_id, user_id, start_link, end_link, name, parse_targets(targets) or [target_chat], dedup_mode or DEDUP_MODE)
+            for job_id, user_id, start_link, end_link, name, target_chat, targets, dedup_mode in self.conn.execute(
+                "SELECT job_id, user_id, start_link, end_link, name, target_chat, targets, dedup_mode "
+                "FROM jobs WHERE status = 'running'"
+            )
+        ]
     
-    try:
-        # Process messages in batches for speed
-        batch_size = 10  # Process 10 messages at a time
+    def load(self, job_id, msg_id_start):
+        """Checkpoint and already completed IDs of a job"""
+        row = self.conn.execute("SELECT checkpoint FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        checkpoint = row[0] if row and row[0] is not None else msg_id_start - 1
+        completed = {
+            msg_id for (msg_id,) in self.conn.execute(
+                "SELECT msg_id FROM job_items WHERE job_id = ? AND msg_id > ? AND result IN ('sent', 'skipped')",
+                (job_id, checkpoint)
+            )
+        }
+        self.progress[job_id] = (checkpoint, completed)
+        return checkpoint, set(completed)
+    
+    def record(self, job_id, msg_ids, result):
+        """Store the result of some message IDs and advance the contiguous checkpoint"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO job_items VALUES (?, ?, ?)",
+            [(job_id, msg_id, result) for msg_id in msg_ids]
+        )
         
-        for batch_start in range(msg_id_start, msg_id_end + 1, batch_size):
-            batch_end = min(batch_start + batch_size - 1, msg_id_end)
-            batch_ids = list(range(batch_start, batch_end + 1))
+        if result in ('sent', 'skipped'):
+            checkpoint, completed = self.progress[job_id]
+            completed.update(msg_ids)
+            advanced = checkpoint
+            while advanced + 1 in completed:
+                advanced += 1
+                completed.discard(advanced)
             
-            try:
-                # Get multiple messages at once
-                messages = await current_client.get_messages(channel_id_start, ids=batch_ids)
-                
-                # Process all messages in batch concurrently
-                tasks = []
-                for message in messages:
-                    if message and message.media:
-                        # Check if it's a video
-                        is_video = False
-                        if message.document:
-                            mime_type = message.document.mime_type
-                            if mime_type and 'video' in mime_type:
-                                is_video = True
-                        elif message.video:
-                            is_video = True
-                        
-                        if is_video:
-                            tasks.append(send_video(message, state, target_chat, current_client))
-                
-                # Send all videos in batch concurrently
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Count successes
-                for result in results:
-                    if result is True:
-                        video_count += 1
-                    elif isinstance(result, Exception):
-                        failed_count += 1
-                        logging.error(f"Error sending video: {result}")
-                
-                processed = batch_end - msg_id_start + 1
-                
-                # Update status every batch
-                await status_msg.edit(
-                    f"🚀 **Fast Processing:** {processed}/{total}\n"
-                    f"✅ **Videos sent:** {video_count}\n"
-                    f"❌ **Failed:** {failed_count}\n"
-                    f"📱 **Session:** {current_session + 1}/{len(session_clients)}"
-                )
-                
-            except FloodWaitError as e:
-                wait_time = e.seconds
-                logging.warning(f"Session {current_session + 1} hit flood wait: {wait_time}s. Switching session...")
-                
-                # Switch to next session
-                current_session = (current_session + 1) % len(session_clients)
-                current_client = session_clients[current_session]
-                
-                await status_msg.edit(
-                    f"⏳ **Switched to session {current_session + 1}**\n"
-                    f"Waiting {wait_time}s...\n"
-                    f"Processing: {processed}/{total}"
+            if advanced != checkpoint:
+                self.progress[job_id] = (advanced, completed)
+                self.conn.execute(
+                    "UPDATE jobs SET checkpoint = ?, updated_at = ? WHERE job_id = ?",
+                    (advanced, time.time(), job_id)
                 )
-                
-                await asyncio.sleep(wait_time)
-                
-            except Exception as e:
-                logging.error(f"Error processing batch {batch_start}-{batch_end}: {e}")
-                failed_count += len(batch_ids)
         
-        await status_msg.edit(
-            f"✅ **Completed!**\n\n"
-            f"📊 **Stats:**\n"
-            f"• Total messages: {total}\n"
-            f"• Videos sent: {video_count}\n"
-            f"• Failed: {failed_count}\n"
-            f"• Sessions used: {len(session_clients)}\n"
-            f"⚡ **Speed:** RAPID MODE"
+        self.conn.commit()
+    
+    def add_stats(self, job_id, stats):
+        """Add one run's counts to a job, resumed jobs add up over their runs"""
+        self.conn.execute(
+            "UPDATE jobs SET videos = videos + ?, failed = failed + ?, duplicates = duplicates + ? WHERE job_id = ?",
+            (stats.video_count, stats.failed_count, stats.duplicate_count, job_id)
         )
-        
-    except Exception as e:
-        await status_msg.edit(f"❌ **Error:** {str(e)}")
-        raise
+        self.conn.commit()
+    
+    def history(self, user_id, limit):
+        """A user's most recent jobs, newest first"""
+        return self.conn.execute(
+            "SELECT job_id, start_link, end_link, name, status, videos, failed, duplicates "
+            "FROM jobs WHERE user_id = ? ORDER BY job_id DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+    
+    def job(self, job_id, user_id):
+        """Links, name and targets of one of the user's jobs"""
+        row = self.conn.execute(
+            "SELECT start_link, end_link, name, target_chat, targets FROM jobs WHERE job_id = ? AND user_id = ?",
+            (job_id, user_id)
+        ).fetchone()
+        if row:
+            return (*row[:3], parse_targets(row[4]) or [row[3]])
+    
+    def details(self, job_id):
+        """Everything known about one job, None if there is no such job"""
+        row = self.conn.execute(
+            "SELECT user_id, start_link, end_link, name, target_chat, targets, dedup_mode, status, videos, failed, duplicates "
+            "FROM jobs WHERE job_id = ?",
+            (job_id,)
+        ).fetchone()
+        if row:
+            user_id, start_link, end_link, name, target_chat, targets, dedup_mode, status, videos, failed, duplicates = row
+            return {
+                "job_id": job_id, "user_id": user_id, "name": name, "start_link": start_link, "end_link": end_link,
+                "targets": parse_targets(targets) or [target_chat], "dedup_mode": dedup_mode or DEDUP_MODE, "status": status,
+                "videos": videos, "failed": failed, "duplicates": duplicates
+            }
+    
+    def finish(self, job_id, status):
+        """Record how a job ended, its per-message items are only needed to resume it"""
+        self.progress.pop(job_id, None)
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id)
+        )
+        self.conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+        self.conn.commit()
 
-async def send_video(message, state, target_chat, client):
-    """Send a single video - used for concurrent processing"""
-    try:
-        # Extract information
-        caption = message.message or ""
-        episode = extract_episode(caption)
-        quality = extract_quality(caption)
-        
-        # Get file size and extension
-        if message.document:
-            file_size = format_size(message.document.size)
-            ext = 'mp4'
-            for attr in message.document.attributes:
-                if hasattr(attr, 'file_name') and attr.file_name:
-                    ext = attr.file_name.split('.')[-1] if '.' in attr.file_name else 'mp4'
-                    break
-        else:
-            file_size = "Unknown"
-            ext = "mp4"
-        
-        # Construct new caption
-        new_caption = f"<{state.name}><{episode}.{ext}><{quality}><{file_size}>"
+class ForwardIndex:
+    """Remembers where every source video was already sent"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS forwarded ("
+            "channel INTEGER, msg_id INTEGER, document_id INTEGER, target_chat INTEGER, "
+            "sent_msg_id INTEGER, caption TEXT, session TEXT, sent_at REAL, "
+            "PRIMARY KEY (channel, msg_id, document_id, target_chat))"
+        )
+        self.conn.commit()
+    
+    @staticmethod
+    def source_key(message):
+        document_id = message.document.id if message.document else 0
+        return message.chat_id, message.id, document_id
+    
+    def lookup(self, message, target_chat):
+        """(sent_msg_id, caption, session) of an earlier forward, None if never sent"""
+        return self.conn.execute(
+            "SELECT sent_msg_id, caption, session FROM forwarded "
+            "WHERE channel = ? AND msg_id = ? AND document_id = ? AND target_chat = ?",
+            (*self.source_key(message), target_chat)
+        ).fetchone()
+    
+    def store(self, message, target_chat, sent_msg_id, caption, session):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO forwarded VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*self.source_key(message), target_chat, sent_msg_id, caption, session, time.time())
+        )
+        self.conn.commit()
+
+def format_targets(targets):
+    return " ".join(str(target) for target in targets)
+
+def parse_targets(text):
+    return [int(target) for target in (text or "").split()]
+
+class UserStateStore:
+    """Per-user conversation state, dropped once idle, optionally kept in SQLite across restarts"""
+    
+    FIELDS = ('mode', 'start_link', 'end_link', 'name', 'dedup_mode', 'plan')
+    
+    def __init__(self, conn, ttl):
+        self.conn = conn  # None keeps states in memory only
+        self.ttl = ttl
+        self.states = OrderedDict()  # user_id -> UserState, least recently touched first
+        if conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_states ("
+                "user_id INTEGER PRIMARY KEY, mode TEXT, start_link TEXT, end_link TEXT, name TEXT, "
+                "dedup_mode TEXT, plan INTEGER, touched REAL, targets TEXT)"
+            )
+            if 'targets' not in {row[1] for row in conn.execute("PRAGMA table_info(user_states)")}:
+                conn.execute("ALTER TABLE user_states ADD COLUMN targets TEXT")
+            conn.commit()
+    
+    def get(self, user_id):
+        """State of a user, loaded or created on first use"""
+        self.evict()
+        state = self.states.get(user_id)
+        if state is None:
+            state = self.load(user_id)
+            self.states[user_id] = state
+        self.states.move_to_end(user_id)
+        state.touched = time.time()
+        return state
+    
+    def load(self, user_id):
+        state = UserState()
+        row = self.conn and self.conn.execute(
+            "SELECT mode, start_link, end_link, name, dedup_mode, plan, touched, targets FROM user_states WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if not row:
+            return state
         
-        # Send message
-        await client.send_message(
-            target_chat,
-            new_caption,
-            file=message.media
+        # Preferences never expire, a conversation left idle too long starts over
+        state.dedup_mode = row[4]
+        state.targets = parse_targets(row[7])
+        if row[6] > time.time() - self.ttl:
+            state.mode, state.start_link, state.end_link, state.name = row[:4]
+            state.plan = bool(row[5])
+        return state
+    
+    def save(self, user_id):
+        if not self.conn:
+            return
+        state = self.states[user_id]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO user_states VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, *(getattr(state, field) for field in self.FIELDS), state.touched, format_targets(state.targets))
         )
+        self.conn.commit()
+    
+    def reset(self, user_id):
+        """Start a user's conversation over, keeping their preferences"""
+        previous = self.get(user_id)
+        state = UserState()
+        state.dedup_mode = previous.dedup_mode
+        state.targets = previous.targets
+        self.states[user_id] = state
+        self.save(user_id)
+        return state
+    
+    def evict(self):
+        """Forget states nobody touched within the TTL, the database keeps their preferences"""
+        expired = time.time() - self.ttl
+        while self.states:
+            user_id, state = next(iter(self.states.items()))
+            if state.touched > expired:
+                break
+            del self.states[user_id]
+
+def init_state():
+    """Open the state database and the stores kept in it"""
+    global state_db, access_cache, journal, forward_index, spool, user_states
+    
+    os.makedirs(DATA_DIR, exist_ok=True)
+    state_db = sqlite3.connect(os.path.join(DATA_DIR, 'bot_state.db'))
+    state_db.execute("PRAGMA journal_mode=WAL")
+    state_db.execute("PRAGMA synchronous=NORMAL")
+    
+    access_cache = ChannelAccessCache(state_db, ACCESS_CACHE_TTL, ACCESS_CACHE_NEGATIVE_TTL)
+    journal = JobJournal(state_db)
+    forward_index = ForwardIndex(state_db)
+    user_states = UserStateStore(state_db if STATE_BACKEND == 'sqlite' else None, USER_STATE_TTL)
+    
+    # Spooled media outlives restarts like the rest of the state
+    spool = MediaSpool(DOWNLOAD_DIR, SPOOL_MAX_BYTES)
+
+# Answers that really mean the session can't read a channel, worth remembering for a while.
+# ValueError is Telethon failing to resolve a channel the session has never seen.
+ACCESS_ERRORS = (
+    ChannelPrivateError, ChannelInvalidError, ChannelBannedError, UserBannedInChannelError,
+    InviteHashExpiredError, InviteHashInvalidError, UsernameNotOccupiedError, UsernameInvalidError, ValueError
+)
+
+async def probe_session(client, index, channel_id, msg_id):
+    """Check if a session can read the given channel message"""
+    key = session_key(index)
+    cached = access_cache.lookup(channel_id, key)
+    if cached is not None:
+        SESSION_PROBES.labels(key, 'cached').inc()
+        return cached[0]
+    
+    try:
+        await ensure_session(index)
         
-        logging.info(f"Successfully sent video with caption: {new_caption}")
-        return True
+        # First try to ensure we're a member of the channel
+        await join_channel_if_needed(client, channel_id)
         
+        # Test if client can access the message
+        message = await client.get_messages(channel_id, ids=msg_id)
+        if message:
+            # Resolved by get_entity above, so this comes from Telethon's entity cache
+            access_cache.store(channel_id, key, True, await client.get_input_entity(channel_id))
+            SESSION_PROBES.labels(key, 'ok').inc()
+            return True
+    except (AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
+        logging.error(f"Session {index+1} is invalid: {e}")
+        count_failure('probe', e)
+        monitor.quarantine(index, type(e).__name__, permanent=True)
+        SESSION_PROBES.labels(key, 'invalid').inc()
+        return False
+    except FloodWaitError as e:
+        # Throttled, not denied, the session can take the channel once the ban is over
+        count_failure('probe', e)
+        scheduler.report_flood(index, e.seconds)
+        SESSION_PROBES.labels(key, 'throttled').inc()
+        return False
+    except ACCESS_ERRORS as e:
+        logging.warning(f"Session {index+1} failed to access message: {e}")
+        count_failure('probe', e)
     except Exception as e:
-        logging.error(f"Error sending video: {e}")
-        raise
+        # Timeouts and dropped connections say nothing about access, try again next time
+        logging.warning(f"Session {index+1} could not probe message: {e}")
+        count_failure('probe', e)
+        SESSION_PROBES.labels(key, 'error').inc()
+        return False
+    
+    access_cache.store(channel_id, key, False)
+    SESSION_PROBES.labels(key, 'no_access').inc()
+    return False
+
+async def get_working_client(channel_id, msg_id):
+    """Try each session client until one works"""
+    with SESSION_DISCOVERY.time():
+        for i in monitor.healthy_indexes():
+            client = session_clients[i]
+            if await probe_session(client, i, channel_id, msg_id):
+                logging.info("Using session %d for message %d", i + 1, msg_id)
+                return client, i
+    
+    return None, -1
+
+async def get_working_clients(channel_id, msg_id):
+    """Probe all session clients at once and return every one that works"""
+    candidates = [(session_clients[i], i) for i in monitor.healthy_indexes()]
+    with SESSION_DISCOVERY.time():
+        results = await asyncio.gather(*(
+            probe_session(client, i, channel_id, msg_id) for client, i in candidates
+        ))
+    
+    working = [(client, i) for (client, i), ok in zip(candidates, results) if ok]
+    if working:
+        logging.info("Using sessions %s for channel %s", ', '.join(str(i + 1) for _, i in working), channel_id)
+    return working
+
+class JobStats:
+    def __init__(self, total):
+        self.total = total
+        self.processed = 0
+        self.video_count = 0
+        self.failed_count = 0
+        self.duplicate_count = 0
+
+class ProgressReporter:
+    """Edits a job's status message from its own task, at most once per interval"""
+    
+    def __init__(self, status_msg, render, interval):
+        self.status_msg = status_msg
+        self.render = render
+        self.interval = interval
+        self.shown = None
+        self.dirty = asyncio.Event()
+        self.task = None
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    def touch(self):
+        """Note that progress changed, never waits"""
+        self.dirty.set()
+    
+    async def run(self):
+        while True:
+            await self.dirty.wait()
+            self.dirty.clear()
+            await self.show(self.render())
+            await asyncio.sleep(self.interval)
+    
+    async def show(self, text):
+        """Edit the status message, True when throttling left the edit still to do"""
+        if text == self.shown:
+            return False
+        try:
+            await self.status_msg.edit(text)
+            self.shown = text
+        except FloodWaitError as e:
+            # The bot account is throttled, keep the update pending until it may edit again
+            logging.warning(f"Status edits throttled for {e.seconds}s")
+            await asyncio.sleep(e.seconds)
+            self.dirty.set()
+            return True
+        except Exception as e:
+            logging.warning(f"Could not update status message: {e}")
+        return False
+    
+    def close(self, final_text):
+        """Stop coalescing and show the final state from a detached task, the job doesn't wait for it"""
+        if self.task:
+            self.task.cancel()
+        asyncio.create_task(self.finish(self.task, final_text))
+    
+    async def finish(self, task, final_text):
+        # The cancelled edit must not land after the final one
+        if task:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # Nothing will edit after this, so wait out every FloodWait until the final state lands
+        while await self.show(final_text):
+            pass
+
+class SessionBudget:
+    """Token bucket and FloodWait deadline for one session"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.banned_until = 0.0
+    
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def available_at(self, now):
+        """Earliest monotonic time this session may issue a request"""
+        self.refill(now)
+        ready = max(now, self.banned_until)
+        if self.tokens >= 1:
+            return ready
+        return max(ready, now + (1 - self.tokens) / self.rate)
+
+class SessionScheduler:
+    """Tracks request budget and flood bans per session index"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.budgets = {}
+    
+    def budget(self, index):
+        if index not in self.budgets:
+            self.budgets[index] = SessionBudget(self.rate, self.burst)
+        return self.budgets[index]
+    
+    def banned_for(self, index):
+        """Seconds left on a session's FloodWait, 0 if it is free"""
+        return max(0.0, self.budget(index).banned_until - time.monotonic())
+    
+    def report_flood(self, index, seconds):
+        budget = self.budget(index)
+        budget.banned_until = max(budget.banned_until, time.monotonic() + seconds)
+        FLOOD_WAIT_SECONDS.labels(session_key(index)).inc(seconds)
+        logging.warning("Session %d banned for %ss by FloodWait", index + 1, seconds, extra={'session': index + 1})
+    
+    async def wait_ready(self, index):
+        """Sleep out a session's FloodWait"""
+        delay = self.banned_for(index)
+        if delay:
+            await asyncio.sleep(delay)
+    
+    async def acquire(self, index):
+        """Take one request token, waiting for refill or ban expiry"""
+        budget = self.budget(index)
+        while True:
+            now = time.monotonic()
+            ready_at = budget.available_at(now)
+            if ready_at <= now:
+                budget.tokens -= 1
+                return
+            await asyncio.sleep(ready_at - now)
+
+# Errors that mean a session is being pushed too hard, rather than a bad message
+CONGESTION_ERRORS = (FloodWaitError, TimedOutError, asyncio.TimeoutError, ConnectionError)
+
+class AdaptiveLimit:
+    """AIMD limit: grows a step while calls are fast and clean, halves on congestion"""
+    
+    SMOOTHING = 0.2
+    MAX_ERROR_RATE = 0.1  # Recent failures above which growth stops
+    BASELINE_DRIFT = 0.01  # How fast the best latency forgets an old minimum
+    
+    def __init__(self, initial, maximum, step, gauge):
+        self.value = float(initial)
+        self.maximum = maximum if AUTOTUNE else initial
+        self.step = step
+        self.gauge = gauge
+        self.best_latency = None
+        self.error_rate = 0.0
+        self.calm_at = 0.0  # Congestion before this is the same event, already backed off
+        gauge.set(self.limit)
+    
+    @property
+    def limit(self):
+        return int(self.value)
+    
+    def grow(self):
+        self.value = min(self.maximum, self.value + self.step)
+    
+    def success(self, latency):
+        self.error_rate -= self.SMOOTHING * self.error_rate
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+        else:
+            self.best_latency += self.BASELINE_DRIFT * (latency - self.best_latency)
+        
+        # Slower than usual means the account is near its limit, hold there
+        if latency <= self.best_latency * AUTOTUNE_LATENCY_FACTOR and self.error_rate <= self.MAX_ERROR_RATE:
+            self.grow()
+            self.gauge.set(self.limit)
+    
+    def error(self):
+        self.error_rate += self.SMOOTHING * (1.0 - self.error_rate)
+    
+    def congestion(self):
+        self.error()
+        now = time.monotonic()
+        if now < self.calm_at:
+            return
+        # Calls in flight when the ban hit fail together, count them as one event
+        self.calm_at = now + (self.best_latency or 1.0) * AUTOTUNE_LATENCY_FACTOR
+        self.value = max(1.0, self.value / 2)
+        self.gauge.set(self.limit)
+
+class SendWindow(AdaptiveLimit):
+    """Adaptive cap on one session's sends in flight"""
+    
+    def __init__(self, initial, maximum, gauge):
+        super().__init__(initial, maximum, 1, gauge)
+        self.in_flight = 0
+        self.changed = asyncio.Condition()
+    
+    def grow(self):
+        # A step per window's worth of successes, not per send
+        self.value = min(self.maximum, self.value + self.step / self.value)
+    
+    async def __aenter__(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+    
+    async def __aexit__(self, *exc):
+        async with self.changed:
+            self.in_flight -= 1
+            self.changed.notify_all()
+
+class SessionTuner:
+    """Fetch batch size and send window learned for one session"""
+    
+    def __init__(self, index):
+        key = session_key(index)
+        self.fetch = AdaptiveLimit(FETCH_BATCH_SIZE, FETCH_BATCH_MAX, max(1, FETCH_BATCH_SIZE // 2), FETCH_BATCH.labels(key))
+        self.sends = SendWindow(SEND_CONCURRENCY, max(SEND_CONCURRENCY, SEND_CONCURRENCY_MAX), SEND_WINDOW.labels(key))
+
+class Autotuner:
+    """Per session AIMD tuning, kept across jobs since it learns the account's limits"""
+    
+    def __init__(self):
+        self.tuners = {}
+    
+    def get(self, index):
+        if index not in self.tuners:
+            self.tuners[index] = SessionTuner(index)
+        return self.tuners[index]
+
+class ShardPool:
+    """Splits a message ID range into shards owned by sessions, with work stealing"""
+    
+    def __init__(self, msg_id_start, msg_id_end, owners, shard_size):
+        shards = [
+            (start, min(start + shard_size - 1, msg_id_end))
+            for start in range(msg_id_start, msg_id_end + 1, shard_size)
+        ]
+        
+        # Give every owner one contiguous block of shards
+        self.deques = {}
+        per_owner = -(-len(shards) // len(owners))
+        for n, owner in enumerate(owners):
+            self.deques[owner] = deque(shards[n * per_owner:(n + 1) * per_owner])
+        
+        # Throttled work waiting for any free session
+        self.retry = deque()
+        # Messages whose sends were throttled, refetched together by ID
+        self.refetch = []
+        # Shards being fetched plus videos waiting to be sent
+        self.in_flight = 0
+        self.wakeup = asyncio.Event()
+    
+    def take(self, owner):
+        """Next shard for an owner: retries first, then its own, then stolen work.
+        Requeued messages come as one (start, end, ids) shard, the fetch batches the IDs"""
+        shard = None
+        if self.retry:
+            shard = self.retry.popleft()
+        elif self.refetch:
+            ids = sorted(self.refetch)
+            self.refetch.clear()
+            shard = (ids[0], ids[-1], ids)
+        elif self.deques[owner]:
+            shard = self.deques[owner].popleft()
+        else:
+            # Steal from the most throttled session first, then the busiest one
+            victim = max(
+                (o for o in self.deques if self.deques[o]),
+                key=lambda o: (scheduler.banned_for(o), len(self.deques[o])),
+                default=None
+            )
+            if victim is not None:
+                shard = self.deques[victim].pop()
+        
+        if shard is not None:
+            self.in_flight += 1
+        return shard
+    
+    def requeue(self, shard):
+        """Hand throttled work to whichever session is free next"""
+        self.retry.append(shard)
+        self.wakeup.set()
+    
+    def requeue_ids(self, msg_ids):
+        """Hand throttled messages back, whoever takes them next fetches them all at once"""
+        self.refetch.extend(msg_ids)
+        self.wakeup.set()
+    
+    def remaining(self):
+        """Message IDs that were never taken"""
+        shards = list(self.retry) + [s for d in self.deques.values() for s in d]
+        return len(self.refetch) + sum(end - start + 1 for start, end in shards)
+    
+    def done(self):
+        """Mark one taken shard or queued video as finished"""
+        self.in_flight -= 1
+        self.wakeup.set()
+    
+    async def next_shard(self, owner):
+        """Wait for work, None once nothing is left anywhere"""
+        while True:
+            shard = self.take(owner)
+            if shard is not None or self.in_flight == 0:
+                return shard
+            self.wakeup.clear()
+            await self.wakeup.wait()
+
+# Shared by all jobs, flood bans are per account
+scheduler = SessionScheduler(SESSION_RATE, SESSION_BURST)
+autotuner = Autotuner()
+job_stats = {}  # job_id -> JobStats of a running job, read by the admin API
+job_profiles = {}  # job_id -> JobProfile of a running job, fed by monitor_loop_lag when PROFILE is on
+
+class JobProfile:
+    """Peak traced memory and event loop lag while one job runs"""
+    
+    def __init__(self):
+        self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.memory_peak = self.memory_start
+        self.lag_max = 0.0
+        self.lag_total = 0.0
+        self.samples = 0
+    
+    def sample(self, lag, memory_peak):
+        # The memory peak is the whole process's, concurrent jobs share it
+        self.memory_peak = max(self.memory_peak, memory_peak)
+        self.lag_max = max(self.lag_max, lag)
+        self.lag_total += lag
+        self.samples += 1
+    
+    def report(self):
+        # Fold in the part of the last sampling interval since the previous sample
+        peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+        logging.info(
+            "📈 Job profile: peak memory %s (%s over start), loop lag max %.3fs, mean %.3fs",
+            format_size(peak), format_size(max(0, peak - self.memory_start)),
+            self.lag_max, self.lag_total / self.samples if self.samples else 0.0,
+            extra={'peak_memory': peak, 'loop_lag': round(self.lag_max, 3)}
+        )
+
+async def run_bulk_job(job_id, state, targets, status_msg):
+    """Run a journaled bulk job and record how it ended"""
+    # Runs in its own task, everything it spawns logs with this job ID
+    log_job.set(job_id)
+    started = time.monotonic()
+    logging.info("Job started: %s to %d target(s)", state.name, len(targets))
+    if PROFILE:
+        job_profiles[job_id] = JobProfile()
+    try:
+        ok = await process_bulk_forward(job_id, state, targets, status_msg)
+        journal.finish(job_id, 'done' if ok else 'failed')
+        logging.info("Job %s", 'done' if ok else 'failed', extra={'elapsed': round(time.monotonic() - started, 3)})
+    except Exception as e:
+        journal.finish(job_id, 'failed')
+        await status_msg.edit(f"❌ **Error:** {str(e)}")
+        logging.error("Bulk forward error: %s", e, extra={'elapsed': round(time.monotonic() - started, 3)})
+    finally:
+        job_stats.pop(job_id, None)
+        profile = job_profiles.pop(job_id, None)
+        if profile:
+            profile.report()
+
+class BulkJob:
+    def __init__(self, job_id, user_id, state, targets, status_msg):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.state = state
+        self.targets = targets
+        self.status_msg = status_msg
+        self.task = None
+        self.cancelled = False
+        self.position = None
+
+class JobQueue:
+    """Runs bulk jobs round-robin across users under global and per-user caps"""
+    
+    def __init__(self, max_running, max_per_user):
+        self.max_running = max_running
+        self.max_per_user = max_per_user
+        self.pending = {}  # user_id -> deque of waiting jobs
+        self.turns = deque()  # users with waiting jobs, in round-robin order
+        self.running = {}  # job_id -> running job
+        self.wakeup = asyncio.Event()
+    
+    def running_for(self, user_id):
+        return sum(1 for job in self.running.values() if job.user_id == user_id)
+    
+    def waiting(self):
+        """Waiting jobs in the order they would start, replaying next_job and its per-user cap"""
+        queues = {user_id: deque(self.pending[user_id]) for user_id in self.turns}
+        running = {user_id: self.running_for(user_id) for user_id in self.turns}
+        turns = deque(self.turns)
+        order = []
+        while turns:
+            for _ in range(len(turns)):
+                user_id = turns[0]
+                turns.rotate(-1)
+                if running[user_id] < self.max_per_user:
+                    break
+            else:
+                # Every user left is at the cap, one of their jobs has to finish first
+                user_id = turns[0]
+                turns.rotate(-1)
+                running[user_id] -= 1
+            
+            order.append(queues[user_id].popleft())
+            running[user_id] += 1
+            if not queues[user_id]:
+                turns.remove(user_id)
+        return order
+    
+    def submit(self, job):
+        """Queue a job, returns its position or 0 when it can start right away"""
+        if job.user_id not in self.pending:
+            self.pending[job.user_id] = deque()
+            self.turns.append(job.user_id)
+        self.pending[job.user_id].append(job)
+        self.wakeup.set()
+        
+        position = self.waiting().index(job) + 1
+        if position <= self.max_running - len(self.running) and self.running_for(job.user_id) < self.max_per_user \
+                and len(self.pending[job.user_id]) == 1:
+            return 0
+        job.position = position
+        return position
+    
+    def next_job(self):
+        """Take the next job allowed to start, None if every candidate is capped"""
+        if len(self.running) >= self.max_running:
+            return None
+        
+        for _ in range(len(self.turns)):
+            user_id = self.turns[0]
+            self.turns.rotate(-1)
+            if self.running_for(user_id) >= self.max_per_user:
+                continue
+            
+            job = self.pending[user_id].popleft()
+            if not self.pending[user_id]:
+                del self.pending[user_id]
+                self.turns.remove(user_id)
+            return job
+        return None
+    
+    async def run(self):
+        """Start jobs whenever a slot frees up"""
+        while True:
+            job = self.next_job()
+            if job is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            
+            self.running[job.job_id] = job
+            job.task = asyncio.create_task(self.execute(job))
+            asyncio.create_task(self.announce_positions())
+    
+    async def execute(self, job):
+        try:
+            await run_bulk_job(job.job_id, job.state, job.targets, job.status_msg)
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                raise
+            journal.finish(job.job_id, 'cancelled')
+            await job.status_msg.edit("🛑 **Cancelled!**")
+        finally:
+            self.running.pop(job.job_id, None)
+            self.wakeup.set()
+    
+    async def announce_positions(self):
+        """Tell waiting users when their place in the queue changes"""
+        for position, job in enumerate(self.waiting(), 1):
+            if job.position == position:
+                continue
+            job.position = position
+            try:
+                await job.status_msg.edit(f"⏳ **Queued:** position {position}\nSend /cancel to drop it.")
+            except Exception as e:
+                logging.warning(f"Could not update queue position of job {job.job_id}: {e}")
+    
+    def find(self, job_id):
+        """A running or waiting job, None when it isn't in the queue"""
+        if job_id in self.running:
+            return self.running[job_id]
+        return next((job for job in self.waiting() if job.job_id == job_id), None)
+    
+    async def cancel_job(self, job_id):
+        """Drop or stop one job, False when it isn't in the queue"""
+        job = self.find(job_id)
+        if job is None:
+            return False
+        
+        if job_id in self.running:
+            job.cancelled = True
+            job.task.cancel()
+            return True
+        
+        waiting = self.pending[job.user_id]
+        waiting.remove(job)
+        if not waiting:
+            del self.pending[job.user_id]
+            self.turns.remove(job.user_id)
+        journal.finish(job_id, 'cancelled')
+        await job.status_msg.edit("🛑 **Cancelled!**")
+        asyncio.create_task(self.announce_positions())
+        return True
+    
+    async def cancel(self, user_id):
+        """Drop a user's waiting jobs and stop the running ones, returns how many"""
+        waiting = self.pending.pop(user_id, deque())
+        if user_id in self.turns:
+            self.turns.remove(user_id)
+        
+        for job in waiting:
+            journal.finish(job.job_id, 'cancelled')
+            await job.status_msg.edit("🛑 **Cancelled!**")
+        
+        running = [job for job in self.running.values() if job.user_id == user_id]
+        for job in running:
+            job.cancelled = True
+            job.task.cancel()
+        
+        if waiting:
+            asyncio.create_task(self.announce_positions())
+        return len(waiting) + len(running)
+
+job_queue = JobQueue(MAX_RUNNING_JOBS, MAX_JOBS_PER_USER)
+
+# Read at scrape time, so only take cheap snapshots
+QUEUED_JOBS.set_function(lambda: sum(len(jobs) for jobs in list(job_queue.pending.values())))
+ACTIVE_JOBS.set_function(lambda: len(job_queue.running))
+HEALTHY_SESSIONS.set_function(lambda: len(monitor.healthy_indexes()))
+
+async def resume_jobs(bot):
+    """Queue bulk jobs interrupted by a restart"""
+    for job_id, user_id, start_link, end_link, name, targets, dedup_mode in journal.unfinished():
+        state = UserState()
+        state.start_link = start_link
+        state.end_link = end_link
+        state.name = name
+        state.dedup_mode = dedup_mode
+        
+        logging.info(f"♻️ Resuming job {job_id} for user {user_id}")
+        if user_id == ADMIN_USER_ID:
+            job_queue.submit(BulkJob(job_id, user_id, state, targets, StatusFeed()))
+            continue
+        try:
+            # Progress goes to the user, targets may be channels
+            status_msg = await bot.send_message(
+                user_id,
+                f"♻️ **Resuming interrupted job:** {name}\nAlready sent videos will be skipped.",
+                parse_mode='markdown'
+            )
+        except Exception as e:
+            logging.error(f"Cannot resume job {job_id}: {e}")
+            journal.finish(job_id, 'failed')
+            continue
+        
+        job_queue.submit(BulkJob(job_id, user_id, state, targets, status_msg))
+
+class StatusFeed:
+    """Status message of a job submitted over the admin API, kept for polling instead of shown in a chat"""
+    
+    def __init__(self):
+        self.text = None
+    
+    async def edit(self, text, **kwargs):
+        self.text = text
+
+def describe_job(job, position=None):
+    """JSON view of a job in the queue, with live counts once it runs"""
+    stats = job_stats.get(job.job_id)
+    return {
+        "job_id": job.job_id,
+        "user_id": job.user_id,
+        "name": job.state.name,
+        "start_link": job.state.start_link,
+        "end_link": job.state.end_link,
+        "targets": job.targets,
+        "dedup_mode": job.state.dedup_mode,
+        "status": "running" if job.job_id in job_queue.running else "queued",
+        "position": position,
+        "progress": stats and {
+            "processed": stats.processed,
+            "total": stats.total,
+            "videos": stats.video_count,
+            "failed": stats.failed_count,
+            "duplicates": stats.duplicate_count
+        },
+        "message": job.status_msg.text if isinstance(job.status_msg, StatusFeed) else None
+    }
+
+def job_view(job_id):
+    """Live view of a queued or running job, the journal's record of a finished one"""
+    job = job_queue.find(job_id)
+    if job is None:
+        return journal.details(job_id)
+    waiting = job_queue.waiting()
+    return describe_job(job, waiting.index(job) + 1 if job in waiting else None)
+
+def create_health_app():
+    """Health, metrics and admin API routes, built on first use since FastAPI is slow to import"""
+    from fastapi import FastAPI, Response, HTTPException, Header, Depends
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel
+    
+    health_app = FastAPI()
+    
+    @health_app.get("/")
+    async def root():
+        return {
+            "status": "running",
+            "bot": "connected" if bot_connected() else "disconnected",
+            "sessions": len(session_clients),
+            "time": datetime.now().isoformat()
+        }
+    
+    @health_app.get("/health")
+    async def health():
+        """Liveness: served by the bot's own loop, failing once that loop stops keeping time"""
+        lag = current_loop_lag()
+        alive = lag <= LIVENESS_MAX_LAG
+        return Response(
+            json.dumps({
+                "status": "healthy" if alive else "unresponsive",
+                "loop_lag": round(lag, 3),
+                "sessions": len(session_clients),
+                "bot_connected": bot_connected()
+            }),
+            status_code=200 if alive else 503,
+            media_type="application/json"
+        )
+    
+    @health_app.get("/ready")
+    async def ready():
+        """Readiness: connected, enough healthy sessions and a queue that isn't backed up"""
+        healthy = len(monitor.healthy_indexes())
+        queued = len(job_queue.waiting())
+        problems = []
+        if not bot_connected():
+            problems.append("bot not connected")
+        if healthy < READY_MIN_SESSIONS:
+            problems.append(f"{healthy} healthy sessions, need {READY_MIN_SESSIONS}")
+        if queued > READY_MAX_QUEUE:
+            problems.append(f"{queued} jobs waiting, limit {READY_MAX_QUEUE}")
+        return Response(
+            json.dumps({
+                "status": "not ready" if problems else "ready",
+                "problems": problems,
+                "healthy_sessions": healthy,
+                "queued_jobs": queued
+            }),
+            status_code=503 if problems else 200,
+            media_type="application/json"
+        )
+    
+    @health_app.get("/metrics")
+    async def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    
+    class JobRequest(BaseModel):
+        start_link: str
+        end_link: str
+        name: str
+        targets: list[int | str]
+        dedup_mode: str = DEDUP_MODE
+    
+    def require_admin(authorization: str = Header(None)):
+        """Admin endpoints need ADMIN_TOKEN as a bearer token"""
+        if not ADMIN_TOKEN:
+            raise HTTPException(404, "Admin API is disabled, set ADMIN_TOKEN")
+        if not authorization or not hmac.compare_digest(authorization, f"Bearer {ADMIN_TOKEN}"):
+            raise HTTPException(401, "Invalid admin token")
+    
+    @health_app.post("/jobs", status_code=202, dependencies=[Depends(require_admin)])
+    async def submit_api_job(request: JobRequest):
+        """Queue a bulk job like the chat conversation does, progress is polled or streamed"""
+        channel_start, msg_id_start = parse_channel_link(request.start_link)
+        channel_end, msg_id_end = parse_channel_link(request.end_link)
+        if not channel_start or channel_start != channel_end or msg_id_start > msg_id_end:
+            raise HTTPException(400, "Links must point to one channel, start before end")
+        if request.dedup_mode not in DEDUP_MODES:
+            raise HTTPException(400, f"dedup_mode must be one of {', '.join(DEDUP_MODES)}")
+        if not request.targets:
+            raise HTTPException(400, "At least one target is needed")
+        if not session_clients:
+            raise HTTPException(503, "No active sessions")
+        
+        try:
+            targets = await resolve_targets(request.targets)
+        except Exception as e:
+            raise HTTPException(400, f"Unknown target: {e}")
+        
+        state = UserState()
+        state.start_link = request.start_link
+        state.end_link = request.end_link
+        state.name = request.name.strip()
+        state.dedup_mode = request.dedup_mode
+        job_id = journal.create(ADMIN_USER_ID, state, targets)
+        position = job_queue.submit(BulkJob(job_id, ADMIN_USER_ID, state, targets, StatusFeed()))
+        logging.info(f"🛰️ Admin API queued job {job_id}: {state.name}")
+        return {"job_id": job_id, "position": position, "targets": targets}
+    
+    @health_app.get("/jobs", dependencies=[Depends(require_admin)])
+    async def list_api_jobs():
+        """Running jobs and the waiting ones in the order they will start"""
+        return {
+            "running": [describe_job(job) for job in list(job_queue.running.values())],
+            "queued": [describe_job(job, position) for position, job in enumerate(job_queue.waiting(), 1)]
+        }
+    
+    @health_app.get("/jobs/{job_id}", dependencies=[Depends(require_admin)])
+    async def get_api_job(job_id: int):
+        view = job_view(job_id)
+        if view is None:
+            raise HTTPException(404, "Unknown job")
+        return view
+    
+    @health_app.get("/jobs/{job_id}/events", dependencies=[Depends(require_admin)])
+    async def stream_api_job(job_id: int):
+        """Server-sent events with the job's view whenever it changes, ending once the job does"""
+        if job_view(job_id) is None:
+            raise HTTPException(404, "Unknown job")
+        
+        async def events():
+            last = None
+            quiet = 0.0
+            while True:
+                live = job_queue.find(job_id) is not None
+                view = job_view(job_id)
+                if view != last:
+                    yield f"event: {'progress' if live else 'done'}\ndata: {json.dumps(view)}\n\n"
+                    last = view
+                    quiet = 0.0
+                if not live:
+                    return
+                
+                await asyncio.sleep(EVENTS_POLL_INTERVAL)
+                quiet += EVENTS_POLL_INTERVAL
+                if quiet >= EVENTS_KEEPALIVE:
+                    # Proxies drop idle connections, a comment line keeps it open
+                    yield ": keepalive\n\n"
+                    quiet = 0.0
+        
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    
+    @health_app.delete("/jobs/{job_id}", dependencies=[Depends(require_admin)])
+    async def cancel_api_job(job_id: int):
+        """Drop a queued job or stop a running one"""
+        if not await job_queue.cancel_job(job_id):
+            raise HTTPException(404, "Job is not queued or running")
+        return {"job_id": job_id, "cancelled": True}
+    
+    return health_app
+
+async def serve_health():
+    """Serve health checks and metrics from the bot's own event loop"""
+    import uvicorn
+    
+    class HealthServer(uvicorn.Server):
+        """uvicorn on the bot's event loop, leaving SIGINT and SIGTERM to the bot"""
+        
+        def install_signal_handlers(self):
+            # uvicorn before 0.29
+            pass
+        
+        @contextlib.contextmanager
+        def capture_signals(self):
+            # uvicorn 0.29 and later
+            yield
+    
+    server = HealthServer(uvicorn.Config(create_health_app(), host="0.0.0.0", port=HEALTH_PORT, log_level="error"))
+    try:
+        await server.serve()
+    except (SystemExit, OSError) as e:
+        # uvicorn exits when it can't bind, the bot keeps running without health checks
+        logging.error(f"❌ Health server stopped: {e!r}")
+
+def format_ranges(numbers):
+    """Collapse sorted numbers into 1-3, 7 style ranges"""
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+class RangePlan:
+    """What a bulk forward of a range would send, gathered without sending anything"""
+    
+    def __init__(self, state, targets, total):
+        self.state = state
+        self.targets = targets
+        self.total = total
+        self.found = 0
+        self.other = 0
+        self.already_forwarded = 0
+        self.size = 0
+        self.videos = []  # (msg_id, caption)
+        self.episodes = defaultdict(list)  # (season or 0, episode) -> qualities seen
+        self.qualities = defaultdict(int)
+    
+    def add(self, message):
+        self.found += 1
+        if not is_video_message(message):
+            self.other += 1
+            return
+        
+        caption = build_caption(message, self.state)
+        self.videos.append((message.id, caption))
+        if message.document:
+            self.size += message.document.size
+        if all(forward_index.lookup(message, target) for target in self.targets):
+            self.already_forwarded += 1
+        
+        meta = parse_caption(message.message or "", document_file_name(message))
+        season = int(meta.season) if meta.season else 0
+        self.episodes[season, int(meta.episode)].append(meta.quality)
+        self.qualities[meta.quality] += 1
+    
+    def gaps(self):
+        """Missing episode numbers and repeated episode/quality pairs, per season"""
+        missing, duplicated = [], []
+        for season in sorted({season for season, _ in self.episodes}):
+            label = f"S{season:02d} " if season else ""
+            numbers = sorted(ep for s, ep in self.episodes if s == season and ep)
+            if numbers:
+                holes = sorted(set(range(numbers[0], numbers[-1] + 1)) - set(numbers))
+                if holes:
+                    missing.append(f"{label}E{format_ranges(holes)}")
+            for number in numbers:
+                qualities = self.episodes[season, number]
+                for quality in sorted(set(qualities)):
+                    if qualities.count(quality) > 1:
+                        duplicated.append(f"{label}E{number:02d} {quality} ×{qualities.count(quality)}")
+        return missing, duplicated
+    
+    def summary(self):
+        missing, duplicated = self.gaps()
+        qualities = ", ".join(f"{q} ×{n}" for q, n in sorted(self.qualities.items(), key=lambda item: -item[1]))
+        lines = [
+            f"🧪 **Plan:** `{self.state.name}`\n",
+            f"📨 **Messages:** {self.found}/{self.total} ({self.total - self.found} deleted or empty IDs)",
+            f"🎬 **Videos:** {len(self.videos)} ({format_size(self.size)})",
+            f"📄 **Other posts:** {self.other}",
+            f"♻️ **Already forwarded:** {self.already_forwarded} (`/dedup {self.state.dedup_mode}`)",
+            f"📀 **Qualities:** {qualities or 'none'}",
+            f"⚠️ **Missing episodes:** {'; '.join(missing) or 'none'}",
+            f"🔁 **Duplicated:** {', '.join(duplicated[:20]) or 'none'}{' ...' if len(duplicated) > 20 else ''}",
+        ]
+        return "\n".join(lines)[:4000]
+    
+    def captions(self):
+        return "\n".join(f"{msg_id}\t{caption}" for msg_id, caption in self.videos)
+
+async def scan_range(client, session_index, channel, msg_id_start, msg_id_end, plan):
+    """Page through a range with full history requests, honouring the session's rate limit"""
+    offset = msg_id_start - 1
+    while offset < msg_id_end:
+        await scheduler.acquire(session_index)
+        try:
+            page = await client.get_messages(
+                channel, limit=PLAN_PAGE_SIZE, min_id=offset, max_id=msg_id_end + 1, reverse=True, wait_time=0
+            )
+        except FloodWaitError as e:
+            count_failure('plan', e)
+            scheduler.report_flood(session_index, e.seconds)
+            await asyncio.sleep(e.seconds)
+            continue
+        
+        MESSAGES_FETCHED.labels(session_key(session_index)).inc(len(page))
+        for message in page:
+            plan.add(message)
+        if len(page) < PLAN_PAGE_SIZE:
+            return
+        offset = page[-1].id
+
+async def run_plan(state, targets, status_msg):
+    """Scan a range and report what a bulk forward would send, without sending"""
+    try:
+        channel_id_start, msg_id_start = parse_channel_link(state.start_link)
+        channel_id_end, msg_id_end = parse_channel_link(state.end_link)
+        
+        if not channel_id_start or channel_id_start != channel_id_end:
+            await status_msg.edit("❌ **Error:** Both links must be valid and from the same channel!")
+            return
+        
+        client, session_index = await get_working_client(channel_id_start, msg_id_start)
+        if not client:
+            await status_msg.edit("❌ **Error:** No session can access this channel!")
+            return
+        
+        # Access may be cached from an earlier run while a lazy session is not connected yet
+        await ensure_session(session_index)
+        channel = access_cache.input_peer(channel_id_start, session_key(session_index)) or channel_id_start
+        plan = RangePlan(state, targets, msg_id_end - msg_id_start + 1)
+        
+        started = time.monotonic()
+        await scan_range(client, session_index, channel, msg_id_start, msg_id_end, plan)
+        logging.info(f"🧪 Planned {plan.total} messages in {time.monotonic() - started:.1f}s")
+        
+        await status_msg.edit(plan.summary(), parse_mode='markdown')
+        
+        # Every caption, as a file since thousands won't fit in a message
+        if plan.videos:
+            report = io.BytesIO(plan.captions().encode())
+            report.name = f"plan-{msg_id_start}-{msg_id_end}.txt"
+            await status_msg.respond(file=report)
+    
+    except Exception as e:
+        count_failure('plan', e)
+        logging.error(f"Error planning range: {e}")
+        await status_msg.edit(f"❌ **Plan failed:** {str(e)}")
+
+# Videos, files, animations and round videos sit behind different search filters,
+# together they cover every message is_video_message accepts
+VIDEO_FILTERS = (
+    InputMessagesFilterVideo, InputMessagesFilterDocument, InputMessagesFilterGif, InputMessagesFilterRoundVideo
+)
+
+async def process_bulk_forward(job_id, state, targets, status_msg):
+    """Process bulk forward with automatic session failover - FAST VERSION"""
+    channel_id_start, msg_id_start = parse_channel_link(state.start_link)
+    channel_id_end, msg_id_end = parse_channel_link(state.end_link)
+    
+    if not channel_id_start or not channel_id_end:
+        await status_msg.edit("❌ **Error:** Invalid links provided!")
+        return False
+    
+    if channel_id_start != channel_id_end:
+        await status_msg.edit("❌ **Error:** Both links must be from the same channel!")
+        return False
+    
+    stats = JobStats(msg_id_end - msg_id_start + 1)
+    job_stats[job_id] = stats
+    
+    # Skip whatever an earlier run of this job already finished
+    checkpoint, completed = journal.load(job_id, msg_id_start)
+    stats.processed = checkpoint - msg_id_start + 1 + len(completed)
+    if checkpoint >= msg_id_end:
+        await status_msg.edit("✅ **Completed!**\n\nNothing left to send for this job.")
+        return True
+    
+    # Find working clients for this channel
+    await status_msg.edit("🔍 **Finding available session...**")
+    if SHARD_SESSIONS:
+        workers = await get_working_clients(channel_id_start, msg_id_start)
+    else:
+        test_client, session_index = await get_working_client(channel_id_start, msg_id_start)
+        workers = [(test_client, session_index)] if test_client else []
+    
+    if not workers:
+        await status_msg.edit(
+            "❌ **Error:** No session can access this channel!\n\n"
+            "**Possible reasons:**\n"
+            "• Channel is private and sessions are not members\n"
+            "• Sessions need to join the channel first\n\n"
+            "**Solution:** Make sure at least one session account joins the channel manually first."
+        )
+        return False
+    
+    await status_msg.edit(
+        f"✅ **Using {len(workers)} session(s):** {', '.join(str(i + 1) for _, i in workers)}\n\n"
+        f"🚀 Starting rapid download..."
+    )
+    
+    # A search covers a wide span in a request or two, so sparse shards can be bigger
+    shard_size = SPARSE_SHARD_SIZE if SPARSE_FETCH else SHARD_SIZE
+    pool = ShardPool(checkpoint + 1, msg_id_end, [i for _, i in workers], shard_size)
+    # Each target gets its own send budget, by default as many sends as the senders can issue
+    senders = max(SEND_CONCURRENCY, SEND_CONCURRENCY_MAX) if AUTOTUNE else SEND_CONCURRENCY
+    per_target = TARGET_CONCURRENCY or len(workers) * senders
+    target_slots = {target: asyncio.Semaphore(per_target) for target in targets}
+    # Requeued videos only go to the targets they still miss, whatever the dedup mode
+    retry_targets = {}  # msg_id -> targets a throttled send didn't reach
+    target_errors = {}  # msg_id -> error of a target that failed while others wait for a retry
+    reporter = ProgressReporter(
+        status_msg,
+        lambda: (
+            f"🚀 **Fast Processing:** {stats.processed}/{stats.total}\n"
+            f"✅ **Videos sent:** {stats.video_count}\n"
+            f"❌ **Failed:** {stats.failed_count}\n"
+            f"📱 **Sessions:** {len(workers)}/{len(session_clients)}"
+        ),
+        STATUS_EDIT_INTERVAL
+    )
+    
+    async def session_worker(client, session_index):
+        """Fetch and send shards with one session until the pool is drained"""
+        # Bounded hand-off between the prefetcher and the sender workers
+        queue = asyncio.Queue(maxsize=PREFETCH_BATCHES * FETCH_BATCH_SIZE)
+        key = session_key(session_index)
+        channel = access_cache.input_peer(channel_id_start, key) or channel_id_start
+        tuner = autotuner.get(session_index)
+        log_session.set(session_index + 1)
+        
+        # Access may be cached from an earlier run while a lazy session is not connected yet
+        try:
+            await ensure_session(session_index)
+        except Exception as e:
+            logging.error(f"Session {session_index + 1} could not connect: {e}")
+            count_failure('connect', e)
+            monitor.quarantine(
+                session_index, type(e).__name__,
+                permanent=isinstance(e, (AuthKeyUnregisteredError, UserDeactivatedBanError))
+            )
+            return
+        
+        def lost_access(error):
+            count_failure('fetch', error)
+            if not isinstance(error, ChannelPrivateError):
+                monitor.quarantine(session_index, type(error).__name__, permanent=True)
+            # Access is gone, forget it, the caller leaves its shard to the other sessions
+            access_cache.evict(channel_id_start, key)
+        
+        async def search_shard(shard_start, shard_end):
+            """Find a shard's videos with media-filtered searches, False when the ID walk has to do it"""
+            if scheduler.banned_for(session_index):
+                pool.requeue((shard_start, shard_end))
+                return True
+            
+            found = {}
+            try:
+                for media_filter in VIDEO_FILTERS:
+                    upper = shard_end + 1
+                    while True:
+                        await scheduler.acquire(session_index)
+                        
+                        started = time.monotonic()
+                        page = await client.get_messages(
+                            channel, limit=SEARCH_PAGE_SIZE, filter=media_filter,
+                            min_id=shard_start - 1, max_id=upper
+                        )
+                        elapsed = time.monotonic() - started
+                        FETCH_LATENCY.labels(key).observe(elapsed)
+                        MESSAGES_FETCHED.labels(key).inc(len(page))
+                        monitor.record(session_index, True, elapsed)
+                        
+                        for message in page:
+                            found[message.id] = message
+                        if len(page) < SEARCH_PAGE_SIZE:
+                            break
+                        upper = page[-1].id
+                
+            except FloodWaitError as e:
+                count_failure('fetch', e)
+                scheduler.report_flood(session_index, e.seconds)
+                tuner.fetch.congestion()
+                pool.requeue((shard_start, shard_end))
+                return True
+                
+            except (ChannelPrivateError, AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
+                lost_access(e)
+                pool.requeue((shard_start, shard_end))
+                raise
+                
+            except Exception as e:
+                logging.warning("Search failed for %d-%d, fetching by ID instead: %s", shard_start, shard_end, e)
+                count_failure('search', e)
+                monitor.record(session_index, False)
+                return False
+            
+            # IDs the searches didn't return are text posts, other media or deleted
+            shard_ids = [i for i in range(shard_start, shard_end + 1) if i not in completed]
+            skipped = []
+            for n, msg_id in enumerate(shard_ids):
+                message = found.pop(msg_id, None)
+                if not is_video_message(message):
+                    skipped.append(msg_id)
+                    continue
+                
+                # Senders can't use this session's media while it's banned, hand the rest to another one
+                if scheduler.banned_for(session_index):
+                    pool.requeue((msg_id, shard_end))
+                    shard_ids = shard_ids[:n]
+                    break
+                
+                # The put may wait on the senders, let the checkpoint move past earlier skips meanwhile
+                if skipped:
+                    journal.record(job_id, skipped, 'skipped')
+                    skipped = []
+                pool.in_flight += 1
+                await queue.put(message)
+            journal.record(job_id, skipped, 'skipped')
+            
+            stats.processed += len(shard_ids)
+            reporter.touch()
+            return True
+        
+        async def fetch_shard(shard_start, shard_end, ids=None):
+            """Fetch one shard, or requeued messages by ID, requeueing the rest when the session gets throttled"""
+            # The searches only pay off over the ID batches they replace, requeued stragglers go by ID
+            sparse = ids is None and SPARSE_FETCH and shard_end - shard_start + 1 > len(VIDEO_FILTERS) * tuner.fetch.limit
+            if sparse and await search_shard(shard_start, shard_end):
+                return
+            
+            wanted = ids if ids is not None else [i for i in range(shard_start, shard_end + 1) if i not in completed]
+            
+            def requeue_rest(first):
+                if ids is None:
+                    pool.requeue((wanted[first], shard_end))
+                else:
+                    pool.requeue_ids(wanted[first:])
+            
+            first = 0
+            while first < len(wanted):
+                batch_ids = wanted[first:first + tuner.fetch.limit]
+                batch_start, batch_end = batch_ids[0], batch_ids[-1]
+                
+                # Don't sit on work while banned, another session can take it
+                if scheduler.banned_for(session_index):
+                    requeue_rest(first)
+                    return
+                
+                try:
+                    await scheduler.acquire(session_index)
+                    
+                    # Get multiple messages at once
+                    started = time.monotonic()
+                    messages = await client.get_messages(channel, ids=batch_ids)
+                    elapsed = time.monotonic() - started
+                    FETCH_LATENCY.labels(key).observe(elapsed)
+                    MESSAGES_FETCHED.labels(key).inc(len(batch_ids))
+                    monitor.record(session_index, True, elapsed)
+                    tuner.fetch.success(elapsed)
+                    
+                    # Hand videos over to the senders, waits while the queue is full.
+                    # The batch lets go of each message as it's handed over, so sent ones can be freed
+                    skipped = []
+                    for n, (msg_id, message) in enumerate(zip(batch_ids, messages)):
+                        messages[n] = None
+                        if is_video_message(message):
+                            pool.in_flight += 1
+                            await queue.put(message)
+                        else:
+                            skipped.append(msg_id)
+                    journal.record(job_id, skipped, 'skipped')
+                    
+                    stats.processed += len(batch_ids)
+                    reporter.touch()
+                    
+                except FloodWaitError as e:
+                    count_failure('fetch', e)
+                    scheduler.report_flood(session_index, e.seconds)
+                    tuner.fetch.congestion()
+                    requeue_rest(first)
+                    return
+                    
+                except (ChannelPrivateError, AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
+                    lost_access(e)
+                    requeue_rest(first)
+                    raise
+                    
+                except Exception as e:
+                    logging.error("Error processing batch %d-%d: %s", batch_start, batch_end, e)
+                    count_failure('fetch', e)
+                    monitor.record(session_index, False)
+                    if isinstance(e, CONGESTION_ERRORS):
+                        tuner.fetch.congestion()
+                    else:
+                        tuner.fetch.error()
+                    stats.failed_count += len(batch_ids)
+                    journal.record(job_id, batch_ids, 'failed')
+                
+                first += len(batch_ids)
+        
+        async def prefetcher():
+            """Read message batches ahead of the senders"""
+            try:
+                while True:
+                    await scheduler.wait_ready(session_index)
+                    shard = await pool.next_shard(session_index)
+                    if shard is None:
+                        break
+                    
+                    try:
+                        await fetch_shard(*shard)
+                    except (ChannelPrivateError, AuthKeyUnregisteredError, UserDeactivatedBanError) as e:
+                        logging.error(f"Session {session_index + 1} lost access to {channel_id_start}: {e}")
+                        break
+                    finally:
+                        pool.done()
+            finally:
+                # One stop marker per sender, a cancelled job cancels its senders instead
+                if not asyncio.current_task().cancelling():
+                    for _ in range(senders):
+                        await queue.put(None)
+        
+        def requeue(messages):
+            # Media references belong to this session, so throttled sends go back for a refetch
+            pool.requeue_ids([message.id for message in messages])
+            stats.processed -= len(messages)
+        
+        def flooded(messages, error):
+            count_failure('send', error)
+            scheduler.report_flood(session_index, error.seconds)
+            requeue(messages)
+        
+        def send_failed(messages, target, error):
+            count_failure('send', error)
+            logging.error("Error sending video to %s: %s", target, error, extra={'msg_id': messages[0].id})
+        
+        def failed(messages):
+            stats.failed_count += len(messages)
+            journal.record(job_id, [m.id for m in messages], 'failed')
+            reporter.touch()
+        
+        def delivered(messages):
+            stats.video_count += len(messages)
+            journal.record(job_id, [m.id for m in messages], 'sent')
+            reporter.touch()
+        
+        def settle(messages, retry, errors, flood=None):
+            """Record a run once each target has it or failed, throttled targets go back for another try"""
+            for target, error in errors.items():
+                send_failed(messages, target, error)
+            
+            if retry:
+                # Failures are counted once the retried targets are done
+                for message in messages:
+                    retry_targets[message.id] = retry
+                    if errors:
+                        target_errors.setdefault(message.id, next(iter(errors.values())))
+                flooded(messages, flood)
+                return
+            
+            lost, sent = [], []
+            for message in messages:
+                (lost if target_errors.pop(message.id, None) or errors else sent).append(message)
+            if lost:
+                failed(lost)
+            if sent:
+                delivered(sent)
+        
+        async def triage(message):
+            """Settle throttling and duplicates, returning the targets the video still has to reach"""
+            if scheduler.banned_for(session_index):
+                requeue([message])
+                return []
+            
+            retry = retry_targets.pop(message.id, None)
+            pending = []
+            try:
+                for target in retry or targets:
+                    if not await forward_duplicate(message, state, target):
+                        pending.append(target)
+            except Exception as e:
+                send_failed([message], target, e)
+                target_errors.pop(message.id, None)
+                failed([message])
+                return []
+            
+            if pending:
+                return pending
+            
+            if retry:
+                # The rest of the targets got it before the retry
+                settle([message], [], {})
+            else:
+                stats.duplicate_count += 1
+                journal.record(job_id, [message.id], 'sent')
+                reporter.touch()
+            return []
+        
+        async def send_to(target, messages, media=None):
+            """One send of a run to one target, an album when there are several videos"""
+            async with target_slots[target], tuner.sends:
+                await scheduler.acquire(session_index)
+                started = time.monotonic()
+                try:
+                    if len(messages) == 1:
+                        copy, sender = await send_video(messages[0], state, target, client, media and media[0])
+                        copies = [copy]
+                    else:
+                        copies, sender = await send_video_album(messages, state, target, client, media)
+                except CONGESTION_ERRORS:
+                    tuner.sends.congestion()
+                    raise
+                except Exception:
+                    tuner.sends.error()
+                    raise
+                else:
+                    tuner.sends.success(time.monotonic() - started)
+                finally:
+                    SEND_LATENCY.labels(key).observe(time.monotonic() - started)
+            
+            # Only the account that posted a copy may edit it, re-uploads may come from the bot
+            owner_key = key if sender is client else BOT_OWNER
+            VIDEOS_SENT.labels(key).inc(len(messages))
+            for message, copy in zip(messages, copies):
+                forward_index.store(message, target, copy.id, copy.message, owner_key)
+            return copies, sender
+        
+        async def send_run(messages, pending):
+            """Send a run to one target, then fan the copies out to the other targets at once"""
+            # A target that refuses the run hands the first send on to the next one
+            errors = {}
+            for n, target in enumerate(pending):
+                try:
+                    copies, sender = await send_to(target, messages)
+                    break
+                except FloodWaitError as e:
+                    settle(messages, pending[n:], errors, e)
+                    return
+                except Exception as e:
+                    if len(messages) == 1:
+                        errors[target] = e
+                        continue
+                    count_failure('send', e)
+                    logging.warning("Album of %d videos failed, sending them one by one: %s", len(messages), e)
+                    for message in messages:
+                        await send_run([message], pending)
+                    return
+            else:
+                settle(messages, [], errors)
+                return
+            
+            # The copies' media is this session's own, so the other targets reuse it.
+            # A copy the bot re-uploaded has media only the bot can send, those targets start over.
+            media = [copy.media for copy in copies] if sender is client else None
+            rest = pending[n + 1:]
+            results = await asyncio.gather(*(send_to(target, messages, media) for target in rest), return_exceptions=True)
+            
+            # Only the throttled targets are retried, the others already have their copy or failed for good
+            retry, flood = [], None
+            for target, result in zip(rest, results):
+                if isinstance(result, FloodWaitError):
+                    retry.append(target)
+                    flood = result
+                elif isinstance(result, Exception):
+                    errors[target] = result
+            settle(messages, retry, errors, flood)
+        
+        async def deliver(batch):
+            pending = [(message, await triage(message)) for message in batch]
+            
+            # Albums can't mix videos with plain documents, and go to the same targets
+            runs = []
+            for message, message_targets in pending:
+                if not message_targets:
+                    continue
+                if runs and runs[-1][1] == message_targets and album_kind(runs[-1][0][-1]) == album_kind(message):
+                    runs[-1][0].append(message)
+                else:
+                    runs.append(([message], message_targets))
+            
+            for messages, message_targets in runs:
+                await send_run(messages, message_targets)
+        
+        async def sender():
+            """Drain the queue and send videos until the stop marker"""
+            stop = False
+            while not stop:
+                message = await queue.get()
+                if message is None:
+                    return
+                
+                # Videos already waiting go out together as one album
+                batch = [message]
+                while len(batch) < ALBUM_SIZE and not queue.empty():
+                    queued = queue.get_nowait()
+                    if queued is None:
+                        stop = True
+                        break
+                    batch.append(queued)
+                
+                try:
+                    await deliver(batch)
+                finally:
+                    for _ in batch:
+                        pool.done()
+                # Don't keep sent messages and their media alive while waiting for the next ones
+                batch = message = None
+        
+        # Enough senders for the largest window, the window decides how many of them send at once
+        await asyncio.gather(prefetcher(), *(sender() for _ in range(senders)))
+    
+    reporter.start()
+    try:
+        await asyncio.gather(*(session_worker(client, i) for client, i in workers))
+        
+        # Work requeued after every session lost access
+        stats.failed_count += pool.remaining()
+        
+        reporter.close(
+            f"✅ **Completed!**\n\n"
+            f"📊 **Stats:**\n"
+            f"• Total messages: {stats.total}\n"
+            f"• Videos sent: {stats.video_count}\n"
+            f"• Failed: {stats.failed_count}\n"
+            f"• Already forwarded: {stats.duplicate_count}\n"
+            f"• Targets: {len(targets)}\n"
+            f"• Sessions used: {len(workers)}\n"
+            f"⚡ **Speed:** RAPID MODE"
+        )
+        return True
+        
+    except Exception as e:
+        reporter.close(f"❌ **Error:** {str(e)}")
+        raise
+    finally:
+        # Cancelled jobs must not keep editing
+        if not reporter.task.done():
+            reporter.task.cancel()
+        journal.add_stats(job_id, stats)
+
+def is_video_message(message):
+    """Check if a fetched message carries a video"""
+    if not message or not message.media:
+        return False
+    
+    if message.document:
+        mime_type = message.document.mime_type
+        return bool(mime_type and 'video' in mime_type)
+    
+    return bool(message.video)
+
+def document_file_name(message):
+    if not message.document:
+        return None
+    return next((attr.file_name for attr in message.document.attributes if getattr(attr, 'file_name', None)), None)
+
+def build_caption(message, state):
+    """Caption a video will be sent with"""
+    # Get file size
+    file_size = format_size(message.document.size) if message.document else "Unknown"
+    
+    # Extract information
+    meta = parse_caption(message.message or "", document_file_name(message))
+    
+    # Construct new caption
+    return f"<{state.name}><{meta.episode}.{meta.ext}><{meta.quality}><{file_size}>"
+
+async def forward_duplicate(message, state, target_chat):
+    """Handle a video that already reached the target, False when it still has to be sent"""
+    if state.dedup_mode == 'resend':
+        return False
+    
+    entry = forward_index.lookup(message, target_chat)
+    if not entry:
+        return False
+    
+    sent_msg_id, old_caption, owner_key = entry
+    if state.dedup_mode == 'skip':
+        log_success('skip', "Skipping message %d, already forwarded as %d", message.id, sent_msg_id, msg_id=message.id)
+        return True
+    
+    # Only the account that sent the copy may edit it
+    new_caption = build_caption(message, state)
+    if owner_key == BOT_OWNER:
+        owner = None
+        editor = bot_client
+    else:
+        owner = next((i for i in range(len(session_clients)) if session_key(i) == owner_key), None)
+        editor = session_clients[owner] if owner is not None else None
+    if editor is None:
+        return False
+    
+    if new_caption != old_caption:
+        if owner is not None:
+            await ensure_session(owner)
+            await scheduler.acquire(owner)
+        try:
+            await editor.edit_message(target_chat, sent_msg_id, new_caption)
+        except FloodWaitError as e:
+            if owner is not None:
+                scheduler.report_flood(owner, e.seconds)
+            logging.warning(f"Could not re-caption message {sent_msg_id} now, keeping the old caption")
+            return True
+        forward_index.store(message, target_chat, sent_msg_id, new_caption, owner_key)
+        log_success('recaption', "Re-captioned message %d: %s", sent_msg_id, new_caption, msg_id=message.id)
+    return True
+
+async def send_video(message, state, target_chat, client, media=None):
+    """Send a single video - used for concurrent processing, media overrides the source's own.
+    Returns the copy and the client that posted it"""
+    started = time.monotonic()
+    try:
+        # Protected channels refuse sends by reference, don't spend a request finding out
+        if media is None and (REUPLOAD_MODE == 'always' or (REUPLOAD_MODE == 'fallback' and message.noforwards)):
+            return await reupload_video(message, state, target_chat, client)
+        
+        new_caption = build_caption(message, state)
+        
+        # Send message
+        try:
+            sent = await client.send_message(
+                target_chat,
+                new_caption,
+                file=media or message.media
+            )
+        except REUPLOAD_ERRORS as e:
+            if REUPLOAD_MODE == 'off' or media is not None:
+                raise
+            logging.warning(
+                "📥 Can't send message %d by reference (%s), re-uploading", message.id, type(e).__name__,
+                extra={'msg_id': message.id}
+            )
+            # The session can still download what it can't post, the bot posts instead
+            uploader = bot_client if isinstance(e, TARGET_ERRORS) and bot_client else client
+            return await reupload_video(message, state, target_chat, client, uploader)
+        
+        log_success(
+            'send', "Successfully sent video with caption: %s", new_caption,
+            msg_id=message.id, elapsed=round(time.monotonic() - started, 3)
+        )
+        return sent, client
+        
+    except Exception as e:
+        logging.error("Error sending video: %s", e, extra={'msg_id': message.id})
+        raise
+
+def album_kind(message):
+    """Media groups only take items of one kind"""
+    return message.video is not None
+
+async def send_video_album(messages, state, target_chat, client, media=None):
+    """Send several videos as one media group, each with its own caption, returns the copies and the client"""
+    started = time.monotonic()
+    try:
+        captions = [build_caption(message, state) for message in messages]
+        
+        # Existing document references, nothing is uploaded again
+        sent = await client.send_file(
+            target_chat,
+            media or [message.media for message in messages],
+            caption=captions
+        )
+        
+        log_success(
+            'album', "Successfully sent album of %d videos: %s ... %s", len(messages), captions[0], captions[-1],
+            msg_id=messages[0].id, elapsed=round(time.monotonic() - started, 3)
+        )
+        return sent, client
+        
+    except Exception as e:
+        logging.error("Error sending album: %s", e, extra={'msg_id': messages[0].id})
+        raise
+
+# Errors a download and re-upload gets around
+TARGET_ERRORS = (ChatWriteForbiddenError, ChatSendMediaForbiddenError, PeerIdInvalidError)
+BOT_OWNER = 'bot'  # Forward index owner of copies the bot account uploaded instead of a session
+REUPLOAD_ERRORS = (ChatForwardsRestrictedError, *TARGET_ERRORS)
+
+class MediaSpool:
+    """Downloaded media on disk, shared by every target and evicted least recently used first"""
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.files = OrderedDict()  # Document id -> size, least recently used first
+        self.pins = {}  # Document id -> sends using the file right now
+        self.downloads = {}  # Document id -> download task
+        self.reserved = 0  # Bytes promised to downloads in progress
+        self.freed = asyncio.Condition()
+        
+        os.makedirs(directory, exist_ok=True)
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            # Partial downloads from before a restart can't be resumed safely
+            if entry.name.endswith('.part'):
+                os.remove(entry.path)
+            elif entry.name.isdigit():
+                self.files[int(entry.name)] = entry.stat().st_size
+        if self.files:
+            logging.info(f"📦 Spool holds {len(self.files)} files ({format_size(self.used())})")
+    
+    def path(self, document_id):
+        return os.path.join(self.directory, str(document_id))
+    
+    def used(self):
+        return sum(self.files.values()) + self.reserved
+    
+    def evict(self, needed):
+        """Drop unpinned files until needed bytes fit, True once they do"""
+        for document_id in list(self.files):
+            if self.used() + needed <= self.max_bytes:
+                break
+            if self.pins.get(document_id):
+                continue
+            size = self.files.pop(document_id)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path(document_id))
+            logging.info(f"🧹 Evicted {document_id} from the spool ({format_size(size)})")
+        return self.used() + needed <= self.max_bytes
+    
+    @contextlib.asynccontextmanager
+    async def open(self, client, document):
+        """Pin the local copy of a document, downloading it unless it's spooled already"""
+        self.pins[document.id] = self.pins.get(document.id, 0) + 1
+        try:
+            if document.id in self.files:
+                self.files.move_to_end(document.id)
+            else:
+                # Sends of the same document to other targets wait for one download
+                task = self.downloads.get(document.id)
+                if task is None:
+                    task = asyncio.create_task(self.download(client, document))
+                    self.downloads[document.id] = task
+                    task.add_done_callback(lambda _: self.downloads.pop(document.id, None))
+                await asyncio.shield(task)
+            yield self.path(document.id)
+        finally:
+            self.pins[document.id] -= 1
+            if not self.pins[document.id]:
+                del self.pins[document.id]
+            async with self.freed:
+                self.freed.notify_all()
+    
+    async def download(self, client, document):
+        if document.size > self.max_bytes:
+            raise ValueError(f"{format_size(document.size)} doesn't fit in a {format_size(self.max_bytes)} spool")
+        
+        async with self.freed:
+            await self.freed.wait_for(lambda: self.evict(document.size))
+            self.reserved += document.size
+        
+        part = self.path(document.id) + '.part'
+        try:
+            await download_parallel(client, document, part)
+            os.replace(part, self.path(document.id))
+            self.files[document.id] = document.size
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part)
+            raise
+        finally:
+            self.reserved -= document.size
+            async with self.freed:
+                self.freed.notify_all()
+
+async def run_transfer(workers):
+    """Run transfer workers together, cancelling the rest when one fails"""
+    tasks = [asyncio.create_task(worker) for worker in workers]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def download_parallel(client, document, path):
+    """Download a document in contiguous ranges fetched side by side, written straight to disk"""
+    chunks = -(-document.size // TRANSFER_CHUNK_SIZE)
+    per_worker = max(1, -(-chunks // TRANSFER_WORKERS))
+    
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, document.size)
+        
+        async def fetch_range(first):
+            offset = first * TRANSFER_CHUNK_SIZE
+            async for chunk in client.iter_download(
+                document, offset=offset, request_size=TRANSFER_CHUNK_SIZE,
+                limit=min(per_worker, chunks - first)
+            ):
+                await asyncio.to_thread(os.pwrite, fd, chunk, offset)
+                offset += len(chunk)
+                TRANSFER_BYTES.labels('download').inc(len(chunk))
+        
+        await run_transfer(fetch_range(first) for first in range(0, chunks, per_worker))
+    finally:
+        os.close(fd)
+
+async def upload_parallel(client, path, name):
+    """Upload a spooled file as parts sent side by side, returning the handle to send it with"""
+    size = os.path.getsize(path)
+    parts = -(-size // TRANSFER_CHUNK_SIZE)
+    big = size > 10 * 1024 * 1024  # Telegram wants the big file API above 10 MB
+    file_id = random.getrandbits(63)
+    pending = iter(range(parts))
+    
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        async def upload_parts():
+            # Workers share one iterator, so every part goes up exactly once
+            for part in pending:
+                data = await asyncio.to_thread(os.pread, fd, TRANSFER_CHUNK_SIZE, part * TRANSFER_CHUNK_SIZE)
+                if big:
+                    await client(SaveBigFilePartRequest(file_id, part, parts, data))
+                else:
+                    await client(SaveFilePartRequest(file_id, part, data))
+                TRANSFER_BYTES.labels('upload').inc(len(data))
+        
+        await run_transfer(upload_parts() for _ in range(min(TRANSFER_WORKERS, parts)))
+    finally:
+        os.close(fd)
+    
+    if big:
+        return InputFileBig(file_id, parts, name)
+    return InputFile(file_id, parts, name, '')
+
+async def reupload_video(message, state, target_chat, client, uploader=None):
+    """Send a video as a fresh upload of its spooled copy, for media that can't be sent by reference.
+    Returns the copy and the uploader, which owns it"""
+    uploader = uploader or client
+    document = message.document
+    new_caption = build_caption(message, state)
+    
+    async with transfer_slots:
+        started = time.monotonic()
+        async with spool.open(client, document) as path:
+            handle = await upload_parallel(uploader, path, message.file.name or f"{document.id}{message.file.ext}")
+        
+        thumb = None
+        if document.thumbs:
+            thumb = await client.download_media(message, file=bytes, thumb=-1)
+        
+        sent = await uploader.send_file(
+            target_chat,
+            handle,
+            caption=new_caption,
+            attributes=document.attributes,
+            mime_type=document.mime_type,
+            thumb=thumb
+        )
+    logging.info(f"📤 Re-uploaded {format_size(document.size)} in {time.monotonic() - started:.1f}s: {new_caption}")
+    return sent, uploader
 
 async def keep_alive():
     """Keep-alive function to prevent bot from sleeping"""
     while True:
         try:
             # Log heartbeat every 5 minutes
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            logging.info(f"💓 Heartbeat: Bot is alive at {current_time}")
+            logging.info("💓 Heartbeat: Bot is alive at %s", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             
-            # Check all session clients are still connected
-            for i, client in enumerate(session_clients):
-                if not client.is_connected():
-                    logging.warning(f"Session {i+1} disconnected! Reconnecting...")
-                    try:
-                        await client.connect()
-                        logging.info(f"✅ Session {i+1} reconnected")
-                    except Exception as e:
-                        logging.error(f"❌ Failed to reconnect session {i+1}: {e}")
+            # Connections are watched by the session monitor
+            logging.info("📱 Sessions: %d/%d healthy", len(monitor.healthy_indexes()), len(session_clients))
+            
+            # Abandoned conversations would otherwise pile up between messages
+            user_states.evict()
             
             # Wait 5 minutes before next heartbeat
             await asyncio.sleep(300)  # 300 seconds = 5 minutes
@@ -491,6 +3024,23 @@ async def keep_alive():
             logging.error(f"Error in keep_alive: {e}")
             await asyncio.sleep(60)  # Wait 1 minute and retry
 
+async def monitor_loop_lag():
+    """Sample how late the event loop wakes up from a timer"""
+    global loop_lag, loop_lag_sampled
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lag_sampled = time.monotonic()
+        loop_lag = max(0.0, loop_lag_sampled - started - LOOP_LAG_INTERVAL)
+        LOOP_LAG.set(loop_lag)
+        
+        if PROFILE:
+            # Peak since the last sample, so each job only sees the intervals it ran in
+            memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            for profile in job_profiles.values():
+                profile.sample(loop_lag, memory_peak)
+
 async def ping_self(bot):
     """Periodically ping the bot to keep it active"""
     while True:
@@ -508,12 +3058,13 @@ async def ping_self(bot):
 
 async def main():
     """Main function to keep the bot running"""
-    global bot_id
+    global bot_id, bot_client
+    startup.mark('module')
     
-    # Start HTTP health check server in background thread
-    health_thread = threading.Thread(target=run_health_server, daemon=True)
-    health_thread.start()
-    logging.info("🏥 HTTP health check server started on port 8000")
+    # Health checks answer from this loop while the bot is still starting
+    asyncio.create_task(serve_health())
+    asyncio.create_task(monitor_loop_lag())
+    logging.info(f"🏥 HTTP health check server started on port {HEALTH_PORT}")
     
     # Initialize bot
     bot = TelegramClient('bot', API_ID, API_HASH)
@@ -522,12 +3073,19 @@ async def main():
     # Get bot ID
     bot_me = await bot.get_me()
     bot_id = bot_me.id
+    bot_client = bot
+    startup.mark('bot login')
     
     logging.info(f"🤖 Bot started successfully! Bot ID: {bot_id}")
     logging.info(f"🕐 Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
+    # Open persistent state before anything reads it
+    init_state()
+    startup.mark('state')
+    
     # Load all session files
     await load_sessions()
+    startup.mark('sessions')
     
     if not session_clients:
         logging.warning("⚠️  Bot is running but no sessions are loaded!")
@@ -538,17 +3096,48 @@ async def main():
     async def start_wrapper(event):
         await start_handler(event)
     
+    @bot.on(events.NewMessage(pattern='/dedup'))
+    async def dedup_wrapper(event):
+        await dedup_handler(event)
+    
+    @bot.on(events.NewMessage(pattern='/targets'))
+    async def targets_wrapper(event):
+        await targets_handler(event)
+    
+    @bot.on(events.NewMessage(pattern='/plan'))
+    async def plan_wrapper(event):
+        await plan_handler(event)
+    
+    @bot.on(events.NewMessage(pattern='/history'))
+    async def history_wrapper(event):
+        await history_handler(event)
+    
+    @bot.on(events.NewMessage(pattern='/repeat'))
+    async def repeat_wrapper(event):
+        await repeat_handler(event)
+    
+    @bot.on(events.NewMessage(pattern='/cancel'))
+    async def cancel_wrapper(event):
+        await cancel_handler(event)
+    
     @bot.on(events.NewMessage(func=lambda e: e.message.text and not e.message.text.startswith('/')))
     async def message_wrapper(event):
         await handle_message(event, bot)
     
     # Start background tasks for anti-sleep
     asyncio.create_task(keep_alive())
+    asyncio.create_task(monitor.run())
+    asyncio.create_task(job_queue.run())
+    asyncio.create_task(resume_jobs(bot))
     asyncio.create_task(ping_self(bot))
     
     logging.info("✅ Bot is now running with anti-sleep protection...")
     logging.info("💓 Heartbeat every 5 minutes | 🏓 Ping every 30 minutes")
-    logging.info("🏥 HTTP health check available on port 8000")
+    logging.info(f"🏥 HTTP health check available on port {HEALTH_PORT} (/health, /ready, /metrics)")
+    
+    startup.mark('handlers')
+    if PROFILE:
+        startup.report()
     
     # Keep running
     await bot.run_until_disconnected()